@@ -1,116 +1,87 @@
 import pandas as pd
-import glob
-import os
 import matplotlib.pyplot as plt
+from sensor_ingest import power_summary
+from stats_engine import pairwise_delta
 
-# ----------------------------
-# 1️⃣ Load execution summary
-# ----------------------------
-exec_df = pd.read_csv("execution_summary.csv")
-
-exec_df["avg_execution_time_s"] = exec_df["avg_execution_time_ms"] / 1000
-
-# ----------------------------
-# 2️⃣ Process HWInfo files
-# ----------------------------
-
-POWER_COLUMN = "CPU Package Power [W]"   # Adjust if needed
-hwinfo_files = glob.glob("hwinfo_files/*.CSV")
-
-power_results = []
-
-for file in hwinfo_files:
-    df = pd.read_csv(file, encoding="latin1")
-    df.columns = df.columns.str.strip()
+# The steps below are functions so pipeline.py can run them incrementally;
+# running this file still does the whole analysis in one go.
 
-    if POWER_COLUMN not in df.columns:
-        continue
-
-    df = df.dropna(subset=[POWER_COLUMN])
-
-    # Remove units and unwanted characters
-    df[POWER_COLUMN] = (
-        df[POWER_COLUMN]
-        .astype(str)
-        .str.replace(",", ".", regex=False)   # convert decimal comma
-        .str.replace(" W", "", regex=False)   # remove unit if exists
-        .str.strip()
-    )
-
-    # Convert to numeric safely
-    df[POWER_COLUMN] = pd.to_numeric(df[POWER_COLUMN], errors="coerce")
-
-    # Drop invalid rows
-    df = df.dropna(subset=[POWER_COLUMN])
-
-    avg_power = df[POWER_COLUMN].mean()
-
-    # Extract pattern & language from filename
-    filename = os.path.basename(file).replace(".CSV", "")
-    pattern, language = filename.split("_")
+emission_factor = 0.6  # Sri Lanka kgCO2/kWh
 
-    power_results.append({
-        "pattern": pattern,
-        "language": language,
-        "avg_power_w": avg_power
-    })
+color_java = "#2E8B57"   # Green
+color_python = "#FF8C00" # Orange
+width = 0.35
 
-power_df = pd.DataFrame(power_results)
+# chart file -> (column, y label, title)
+CHARTS = {
+    "energy_comparison.png": ("energy_j", "Energy (J)", "Energy Consumption by Pattern and Language"),
+    "time_comparison.png": ("avg_execution_time_ms", "Execution Time (ms)", "Execution Time by Pattern and Language"),
+    "power_comparison.png": ("avg_power_w", "Average Power (W)", "Average CPU Power by Pattern and Language"),
+}
 
-# ----------------------------
-# 3️⃣ Merge Execution + Power
-# ----------------------------
-merged = pd.merge(exec_df, power_df, on=["pattern", "language"])
 
 # ----------------------------
-# 4️⃣ Compute Energy
+# 1️⃣ Load execution summary
 # ----------------------------
-merged["energy_j"] = merged["avg_execution_time_s"] * merged["avg_power_w"]
+def load_execution_summary(path="execution_summary.csv"):
+    exec_df = pd.read_csv(path)
 
-# ----------------------------
-# 5️⃣ Carbon Emission
-# ----------------------------
-emission_factor = 0.6  # Sri Lanka kgCO2/kWh
+    exec_df["avg_execution_time_s"] = exec_df["avg_execution_time_ms"] / 1000
+    return exec_df
 
-merged["energy_kwh"] = merged["energy_j"] / 3600000
-merged["carbon_kg"] = merged["energy_kwh"] * emission_factor
 
 # ----------------------------
-# 6️⃣ Energy per message
+# 2️⃣ Process HWInfo files
 # ----------------------------
-merged["energy_per_message_j"] = merged["energy_j"] / merged["runs"]
+def load_power(folder="hwinfo_files"):
+    # Only Date, Time and the power column are read, in chunks, and the parsed
+    # values are cached in hwinfo_files/.cache (see sensor_ingest.py)
+    power_df = power_summary(folder).rename(columns={"average_power_w": "avg_power_w"})
+    return power_df[["pattern", "language", "avg_power_w"]]
 
 
-# ----------------------------
-# 9️⃣ Percentage Difference (Python vs Java)
-# ----------------------------
+def compute_energy(exec_df, power_df):
+    # ----------------------------
+    # 3️⃣ Merge Execution + Power
+    # ----------------------------
+    merged = pd.merge(exec_df, power_df, on=["pattern", "language"])
 
-merged["energy_diff_vs_java_%"] = None
+    # ----------------------------
+    # 4️⃣ Compute Energy
+    # ----------------------------
+    merged["energy_j"] = merged["avg_execution_time_s"] * merged["avg_power_w"]
 
-for pattern in merged["pattern"].unique():
-    subset = merged[merged["pattern"] == pattern]
+    # ----------------------------
+    # 5️⃣ Carbon Emission
+    # ----------------------------
+    merged["energy_kwh"] = merged["energy_j"] / 3600000
+    merged["carbon_kg"] = merged["energy_kwh"] * emission_factor
 
-    if "java" in subset["language"].values and "python" in subset["language"].values:
-        java_energy = subset[subset["language"]=="java"]["energy_j"].values[0]
-        python_energy = subset[subset["language"]=="python"]["energy_j"].values[0]
+    # ----------------------------
+    # 6️⃣ Energy per message
+    # ----------------------------
+    merged["energy_per_message_j"] = merged["energy_j"] / merged["runs"]
+    return merged
 
-        diff = ((python_energy - java_energy) / java_energy) * 100
 
-        merged.loc[
-            (merged["pattern"]==pattern) & (merged["language"]=="python"),
-            "energy_diff_vs_java_%"
-        ] = round(diff,2)
+# ----------------------------
+# 9️⃣ Percentage Difference (Python vs Java)
+# ----------------------------
+def add_language_diff(merged):
+    # one pivot for all patterns (see stats_engine.py); the value goes on the python rows
+    diff = pairwise_delta(merged, "pattern", "language", "energy_j",
+                          base="java", other="python", agg="first").round(2)
+    on_python = (merged["language"] == "python").to_numpy()
+    values = merged["pattern"].map(diff).where(on_python)
+    merged["energy_diff_vs_java_%"] = values.astype(object).where(values.notna(), None)
+    return merged
 
-print("\nPercentage Difference (Python vs Java):")
-print(merged[["pattern","language","energy_diff_vs_java_%"]])
 
 # ----------------------------
 # 1️⃣1️⃣ Correlation Analysis
 # ----------------------------
-
-correlation = merged["energy_j"].corr(merged["avg_execution_time_ms"])
-
-print("\nCorrelation between Execution Time and Energy:", round(correlation,3))
+def correlation(merged):
+    return merged["energy_j"].corr(merged["avg_execution_time_ms"])
 
 # ----------------------------
 # 1️⃣2️⃣ Independent t-test
@@ -132,85 +103,68 @@ print("\nCorrelation between Execution Time and Energy:", round(correlation,3))
 # else:
 #     print("Result: No Statistically Significant Difference")
 
-# ----------------------------
-# 7️⃣ Save Final Results
-# ----------------------------
-merged.to_csv("final_research_results.csv", index=False)
-
-print("Final Results:")
-print(merged)
 
 # ----------------------------
 # 8️⃣ Visualization
 # ----------------------------
+def plot_comparison(merged, path):
+    column, ylabel, title = CHARTS[path]
 
+    patterns = merged["pattern"].unique()
+    x = range(len(patterns))
 
-color_java = "#2E8B57"   # Green
-color_python = "#FF8C00" # Orange
-width = 0.35
-
-patterns = merged["pattern"].unique()
-x = range(len(patterns))
-
-plt.figure(figsize=(8,5))
+    plt.figure(figsize=(8,5))
 
-java_vals = merged[merged["language"]=="java"].set_index("pattern").loc[patterns]["energy_j"]
-python_vals = merged[merged["language"]=="python"].set_index("pattern").loc[patterns]["energy_j"]
+    java_vals = merged[merged["language"]=="java"].set_index("pattern").loc[patterns][column]
+    python_vals = merged[merged["language"]=="python"].set_index("pattern").loc[patterns][column]
 
-plt.bar([i - width/2 for i in x], java_vals, width=width, label="Java", color=color_java)
-plt.bar([i + width/2 for i in x], python_vals, width=width, label="Python", color=color_python)
+    plt.bar([i - width/2 for i in x], java_vals, width=width, label="Java", color=color_java)
+    plt.bar([i + width/2 for i in x], python_vals, width=width, label="Python", color=color_python)
 
-plt.xticks(x, patterns)
-plt.ylabel("Energy (J)")
-plt.title("Energy Consumption by Pattern and Language")
-plt.legend()
-plt.grid(axis="y", linestyle="--", alpha=0.6)
+    plt.xticks(x, patterns)
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.legend()
+    plt.grid(axis="y", linestyle="--", alpha=0.6)
 
-plt.savefig("energy_comparison.png")
-plt.close()
+    plt.savefig(path)
+    plt.close()
 
-plt.figure(figsize=(8,5))
 
-java_vals = merged[merged["language"]=="java"].set_index("pattern").loc[patterns]["avg_execution_time_ms"]
-python_vals = merged[merged["language"]=="python"].set_index("pattern").loc[patterns]["avg_execution_time_ms"]
+def plot_overall(merged, path="overall_energy.png"):
+    overall = merged.groupby("language")[["energy_j"]].mean()
 
-plt.bar([i - width/2 for i in x], java_vals, width=width, label="Java", color=color_java)
-plt.bar([i + width/2 for i in x], python_vals, width=width, label="Python", color=color_python)
+    plt.figure(figsize=(6,5))
+    plt.bar(overall.index, overall["energy_j"], color=[color_java, color_python])
 
-plt.xticks(x, patterns)
-plt.ylabel("Execution Time (ms)")
-plt.title("Execution Time by Pattern and Language")
-plt.legend()
-plt.grid(axis="y", linestyle="--", alpha=0.6)
+    plt.ylabel("Average Energy (J)")
+    plt.title("Overall Average Energy by Language")
+    plt.grid(axis="y", linestyle="--", alpha=0.6)
 
-plt.savefig("time_comparison.png")
-plt.close()
+    plt.savefig(path)
+    plt.close()
 
-plt.figure(figsize=(8,5))
 
-java_vals = merged[merged["language"]=="java"].set_index("pattern").loc[patterns]["avg_power_w"]
-python_vals = merged[merged["language"]=="python"].set_index("pattern").loc[patterns]["avg_power_w"]
+if __name__ == "__main__":
 
-plt.bar([i - width/2 for i in x], java_vals, width=width, label="Java", color=color_java)
-plt.bar([i + width/2 for i in x], python_vals, width=width, label="Python", color=color_python)
+    exec_df = load_execution_summary()
+    power_df = load_power()
 
-plt.xticks(x, patterns)
-plt.ylabel("Average Power (W)")
-plt.title("Average CPU Power by Pattern and Language")
-plt.legend()
-plt.grid(axis="y", linestyle="--", alpha=0.6)
+    merged = add_language_diff(compute_energy(exec_df, power_df))
 
-plt.savefig("power_comparison.png")
-plt.close()
+    print("\nPercentage Difference (Python vs Java):")
+    print(merged[["pattern","language","energy_diff_vs_java_%"]])
 
-overall = merged.groupby("language")[["energy_j"]].mean()
+    print("\nCorrelation between Execution Time and Energy:", round(correlation(merged),3))
 
-plt.figure(figsize=(6,5))
-plt.bar(overall.index, overall["energy_j"], color=[color_java, color_python])
+    # ----------------------------
+    # 7️⃣ Save Final Results
+    # ----------------------------
+    merged.to_csv("final_research_results.csv", index=False)
 
-plt.ylabel("Average Energy (J)")
-plt.title("Overall Average Energy by Language")
-plt.grid(axis="y", linestyle="--", alpha=0.6)
+    print("Final Results:")
+    print(merged)
 
-plt.savefig("overall_energy.png")
-plt.close()
\ No newline at end of file
+    for path in CHARTS:
+        plot_comparison(merged, path)
+    plot_overall(merged)
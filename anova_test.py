@@ -1,9 +1,9 @@
-import os
 import sqlite3
 import pandas as pd
 import numpy as np
-from statsmodels.formula.api import ols
-import statsmodels.api as sm
+from sensor_ingest import power_summary
+from energy_join import load_runs, load_samples, join
+from stats_engine import group_summary, bootstrap_ci, bootstrap_delta_ci, two_way_anova
 
 # ==============================
 # CONFIGURATION
@@ -20,7 +20,7 @@ POWER_COLUMN = "CPU Package Power [W]"   # CHANGE if needed
 def load_execution_data():
     conn = sqlite3.connect(DB_PATH)
     query = """
-        SELECT pattern, language, execution_time_ms
+        SELECT id, pattern, language, execution_time_ms
         FROM benchmark_results
     """
     df = pd.read_sql_query(query, conn)
@@ -35,63 +35,16 @@ def load_execution_data():
 # ==============================
 
 def extract_average_power():
-    power_data = []
+    # chunked read of the power column only, cached per log (sensor_ingest.py)
+    power_df = power_summary(HWINFO_FOLDER, POWER_COLUMN)
 
-    for file in os.listdir(HWINFO_FOLDER):
-        if file.lower().endswith(".csv"):
+    for row in power_df.itertuples():
+        print(f"✓ Processed {row.pattern}_{row.language} | Avg Power = {row.average_power_w:.2f} W")
 
-            file_path = os.path.join(HWINFO_FOLDER, file)
-
-            try:
-                df = pd.read_csv(file_path, encoding="latin1")
-
-                if POWER_COLUMN not in df.columns:
-                    print(f"⚠ Power column not found in {file}")
-                    continue
-
-                # FORCE NUMERIC CONVERSION
-                df[POWER_COLUMN] = pd.to_numeric(
-                    df[POWER_COLUMN],
-                    errors="coerce"
-                )
-
-                # DROP invalid values
-                df_clean = df.dropna(subset=[POWER_COLUMN])
-
-                if df_clean.empty:
-                    print(f"⚠ No valid power data in {file}")
-                    continue
-
-                avg_power = df_clean[POWER_COLUMN].mean()
-
-                # Extract pattern and language
-                # Example: decorator_java.CSV
-                name = file.replace(".csv", "").replace(".CSV", "")
-                parts = name.split("_")
-
-                if len(parts) != 2:
-                    print(f"⚠ Filename format incorrect: {file}")
-                    continue
-
-                pattern = parts[0]
-                language = parts[1]
-
-                power_data.append({
-                    "pattern": pattern,
-                    "language": language,
-                    "average_power_w": avg_power
-                })
-
-                print(f"✓ Processed {file} | Avg Power = {avg_power:.2f} W")
-
-            except Exception as e:
-                print(f"Error reading {file}: {e}")
-
-    if not power_data:
+    if power_df.empty:
         print("❌ No power data extracted!")
-        return pd.DataFrame(columns=["pattern", "language", "average_power_w"])
 
-    return pd.DataFrame(power_data)
+    return power_df[["pattern", "language", "average_power_w"]]
 
 
 # ==============================
@@ -108,7 +61,16 @@ def prepare_final_dataset(exec_df, power_df):
         merged["average_power_w"]
     )
 
-    return merged
+    # runs that recorded start_ts/end_ts: integrate the sensor log over the
+    # run's own window instead of using the whole log's average power
+    runs = join(load_runs(DB_PATH), *load_samples(HWINFO_FOLDER, POWER_COLUMN))
+    runs = runs.dropna(subset=["energy_j"])[["id", "energy_j"]]
+    merged = merged.merge(runs.rename(columns={"energy_j": "window_energy_j"}),
+                          on="id", how="left")
+    merged["energy_j"] = merged["window_energy_j"].fillna(merged["energy_j"])
+    print(f"{merged['window_energy_j'].notna().sum()} runs use per-window energy")
+
+    return merged.drop(columns="window_energy_j")
 
 
 # ==============================
@@ -122,16 +84,16 @@ def run_two_way_anova(df):
     print(" Factors: Pattern × Language")
     print("==============================\n")
 
-    model = ols(
-        'energy_j ~ C(pattern) + C(language) + C(pattern):C(language)',
-        data=df
-    ).fit()
-
-    anova_table = sm.stats.anova_lm(model, typ=2)
+    anova_table = two_way_anova(df, "pattern", "language", "energy_j")
     print(anova_table)
 
-    print("\nModel Summary:")
-    print(model.summary())
+    # per-cell means with bootstrap CIs over the individual runs
+    print("\nEnergy per Pattern × Language (95% bootstrap CI):")
+    print(group_summary(df, ["pattern", "language"], "energy_j")
+          .join(bootstrap_ci(df, ["pattern", "language"], "energy_j")))
+
+    print("\nPython vs Java energy (%, 95% bootstrap CI):")
+    print(bootstrap_delta_ci(df, "pattern", "language", "energy_j", base="java", other="python"))
 
 
 # ==============================
@@ -1,22 +1,11 @@
-import sqlite3
+import os, sys
 
-conn = sqlite3.connect("telemetry_results.db")
-cursor = conn.cursor()
+# the schema lives in python/ResultsStore.py, shared with the runners
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "python"))
+from ResultsStore import ResultsStore
 
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS benchmark_results (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT,
-    pattern TEXT,
-    language TEXT,
-    messages INTEGER,
-    execution_time_ms REAL,
-    average_power_w REAL,
-    energy_j REAL
-)
-""")
-
-conn.commit()
-conn.close()
+store = ResultsStore(sys.argv[1] if len(sys.argv) > 1 else "telemetry_results.db")
+store.connect()   # creates the table, adds missing columns and indexes
+store.close()
 
 print("Database created successfully.")
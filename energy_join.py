@@ -0,0 +1,144 @@
+import sys
+import sqlite3
+import numpy as np
+import pandas as pd
+from sensor_ingest import load, log_files, POWER_COLUMN
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+DB_PATH = "telemetry_results.db"
+HWINFO_FOLDER = "hwinfo_files"
+MAX_GAP_S = 10.0      # a window spanning a longer gap between samples is not integrated
+OUT_CSV = "run_energy.csv"
+
+
+# ==============================
+# 1. LOAD SENSOR SAMPLES AND RUNS
+# ==============================
+
+def load_samples(folder=HWINFO_FOLDER, column=POWER_COLUMN):
+    """All logs in folder merged into one time-sorted (t seconds, watts) pair."""
+    return merge_samples(log_files(folder), column)
+
+
+def merge_samples(paths, column=POWER_COLUMN):
+    t, p = [], []
+    for path in paths:
+        try:
+            df = load(path, [column])
+        except KeyError:
+            continue
+        df = df.dropna()
+        t.append(df["time"].to_numpy("datetime64[ns]").astype(np.int64) / 1e9)
+        p.append(df[column].to_numpy(np.float64))
+    if not t:
+        return np.array([]), np.array([])
+    t, p = np.concatenate(t), np.concatenate(p)
+    order = np.argsort(t, kind="stable")
+    t, p = t[order], p[order]
+    keep = np.r_[True, np.diff(t) > 0]   # overlapping logs: one sample per instant
+    return t[keep], p[keep]
+
+
+def load_runs(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(benchmark_results)")}
+    if "start_ts" not in cols:
+        conn.close()
+        return pd.DataFrame(columns=["id", "pattern", "language", "start_ts", "end_ts"])
+    df = pd.read_sql_query("""
+        SELECT id, pattern, language, messages, execution_time_ms, start_ts, end_ts
+        FROM benchmark_results
+        WHERE start_ts IS NOT NULL AND end_ts IS NOT NULL
+    """, conn)
+    conn.close()
+    return df
+
+
+# ==============================
+# 2. WINDOW INTEGRATION
+# ==============================
+
+def integrate_windows(t, p, start, end, max_gap=MAX_GAP_S):
+    """
+    Trapezoidal integral of p(t) over every [start, end] window at once.
+
+    F is the running integral at each sample; between samples p is linear,
+    so F at any instant x is F[i] plus the trapezoid from t[i] to x, with i
+    found by searchsorted. A window's energy is then F(end) - F(start).
+    Windows not fully covered by samples, or spanning a gap longer than
+    max_gap, get NaN.
+    """
+    start, end = np.asarray(start, np.float64), np.asarray(end, np.float64)
+    nan = np.full(len(start), np.nan)
+    if len(t) < 2:
+        return nan, np.zeros(len(start), np.int64)
+
+    dt = np.diff(t)
+    F = np.r_[0.0, np.cumsum((p[1:] + p[:-1]) / 2 * dt)]
+    big = np.r_[0, np.cumsum(dt > max_gap)]   # gaps before each sample
+
+    def at(x):
+        i = np.clip(np.searchsorted(t, x, side="right") - 1, 0, len(t) - 2)
+        px = p[i] + (p[i + 1] - p[i]) * (x - t[i]) / dt[i]
+        return F[i] + (x - t[i]) * (p[i] + px) / 2, i
+
+    Fa, ia = at(start)
+    Fb, ib = at(end)
+    energy = Fb - Fa
+    samples = np.searchsorted(t, end, side="right") - np.searchsorted(t, start, side="left")
+    covered = (start >= t[0]) & (end <= t[-1]) & (end >= start) & (big[ib + 1] == big[ia])
+    return np.where(covered, energy, nan), samples
+
+
+def join(runs, t, p, max_gap=MAX_GAP_S):
+    runs = runs.copy()
+    start = pd.to_datetime(runs["start_ts"]).to_numpy("datetime64[ns]").astype(np.int64) / 1e9
+    end = pd.to_datetime(runs["end_ts"]).to_numpy("datetime64[ns]").astype(np.int64) / 1e9
+    energy, samples = integrate_windows(t, p, start, end, max_gap)
+    runs["window_s"] = end - start
+    runs["samples"] = samples
+    runs["energy_j"] = energy
+    runs["average_power_w"] = energy / np.where(end > start, end - start, np.nan)
+    return runs
+
+
+# ==============================
+# 3. WRITE BACK
+# ==============================
+
+def update_db(joined, db_path=DB_PATH):
+    """Store sensor-log energy for runs without an in-process measurement."""
+    rows = joined.dropna(subset=["energy_j"])
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.executemany("""
+        UPDATE benchmark_results SET energy_j = ?, average_power_w = ?
+        WHERE id = ? AND (energy_j IS NULL OR energy_j = 0)
+    """, zip(rows["energy_j"], rows["average_power_w"], rows["id"].astype(int)))
+    conn.commit()
+    n = conn.total_changes
+    conn.close()
+    return n
+
+
+if __name__ == "__main__":
+
+    # python energy_join.py [db] [hwinfo folder] [--update]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    db_path = args[0] if len(args) > 0 else DB_PATH
+    folder = args[1] if len(args) > 1 else HWINFO_FOLDER
+
+    t, p = load_samples(folder)
+    runs = load_runs(db_path)
+    joined = join(runs, t, p)
+    joined.to_csv(OUT_CSV, index=False)
+
+    matched = joined.dropna(subset=["energy_j"])
+    print(f"{len(matched)} of {len(joined)} runs covered by sensor samples")
+    if not matched.empty:
+        print(matched.groupby(["pattern", "language"])[["energy_j", "average_power_w"]].mean())
+
+    if "--update" in sys.argv:
+        print(f"Updated {update_db(joined, db_path)} rows")
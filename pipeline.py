@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+import analysis
+from sensor_ingest import summarize, log_files
+from energy_join import load_runs, merge_samples, integrate_windows, MAX_GAP_S
+
+# Incremental version of analysis.py (+ per-run energy from energy_join.py).
+#
+#   ingest     one power summary per HWiNFO log
+#   run energy per-run joules over each run's start_ts/end_ts window
+#   aggregate  one results row per (pattern, language)
+#   stats      Python-vs-Java difference and correlation -> final CSV
+#   plots      one chart per figure
+#
+# Every unit of work is keyed by a hash of exactly the inputs it reads, and
+# its output is cached under .pipeline_cache. A unit whose key is unchanged
+# is loaded instead of recomputed, so one new HWiNFO log re-ingests that
+# log, re-aggregates its (pattern, language) group and redraws only the
+# charts whose plotted values moved.
+#
+# Run: python pipeline.py [--force]
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+DB_PATH = "telemetry_results.db"
+HWINFO_FOLDER = "hwinfo_files"
+EXEC_SUMMARY = "execution_summary.csv"
+RESULTS_CSV = "final_research_results.csv"
+CACHE_DIR = ".pipeline_cache"
+
+
+# ==============================
+# CACHE
+# ==============================
+
+def digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            h.update(",".join(map(str, part.columns)).encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class Cache:
+    """Pickled stage outputs plus a manifest of output files and the key
+    each was produced from."""
+
+    def __init__(self, folder=CACHE_DIR, force=False):
+        self.folder = folder
+        self.force = force
+        self.manifest_path = os.path.join(folder, "manifest.json")
+        os.makedirs(folder, exist_ok=True)
+        try:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.hits, self.misses = [], []
+
+    def _path(self, name):
+        return os.path.join(self.folder, name.replace("/", "__") + ".pkl")
+
+    def get(self, name, key, compute):
+        """compute() once per key; afterwards the cached value is returned."""
+        path = self._path(name)
+        if not self.force and self.manifest.get(name) == key and os.path.exists(path):
+            with open(path, "rb") as f:
+                self.hits.append(name)
+                return pickle.load(f)
+        value = compute()
+        self.put(name, key, value)
+        self.misses.append(name)
+        return value
+
+    def put(self, name, key, value):
+        path = self._path(name)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(value, f)
+        os.replace(path + ".tmp", path)
+        self.manifest[name] = key
+
+    def file(self, path, key, write):
+        """Call write(path) unless path exists and was written for this key."""
+        name = "file:" + path
+        if not self.force and self.manifest.get(name) == key and os.path.exists(path):
+            self.hits.append(name)
+            return
+        write(path)
+        self.manifest[name] = key
+        self.misses.append(name)
+
+    def file_key(self, path):
+        # content hash, reused while size and mtime are unchanged
+        st = os.stat(path)
+        stat = [st.st_size, st.st_mtime_ns]
+        known = self.manifest.get("stat:" + path)
+        if known and known[0] == stat:
+            return known[1]
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+        self.manifest["stat:" + path] = [stat, h.hexdigest()]
+        return h.hexdigest()
+
+    def save(self):
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+
+# ==============================
+# 1. INGEST
+# ==============================
+
+def stage_ingest(cache, folder=HWINFO_FOLDER):
+    """Power summary row and file key per log."""
+    rows, keys = [], {}
+    for path in log_files(folder):
+        keys[path] = key = cache.file_key(path)
+        row = cache.get(f"ingest/{os.path.basename(path)}", key, lambda: summarize(path))
+        if row is not None:
+            rows.append({"pattern": row["pattern"], "language": row["language"],
+                         "avg_power_w": row["average_power_w"]})
+    power_df = pd.DataFrame(rows, columns=["pattern", "language", "avg_power_w"])
+    return power_df, keys
+
+
+# ==============================
+# 2. PER-RUN ENERGY
+# ==============================
+
+def stage_run_energy(cache, file_keys, db_path=DB_PATH):
+    """Window energy per run id. Runs already integrated against the same
+    set of logs are taken from the cache; only new runs are integrated.
+    Entries are keyed by (id, start_ts, end_ts): ids restart when the
+    database is recreated, so an id alone could pick up another run's energy."""
+    if not os.path.exists(db_path):
+        return pd.DataFrame(columns=["id", "pattern", "language", "energy_j"])
+    runs = load_runs(db_path)
+    samples_key = digest(sorted(file_keys.values()), MAX_GAP_S)
+
+    keys = list(zip(runs["id"].tolist(), runs["start_ts"].tolist(), runs["end_ts"].tolist()))
+    known = cache.get("run_energy/windows", samples_key, lambda: {})
+    new = [k not in known for k in keys]
+    if any(new):
+        todo = runs[new]
+        t, p = cache.get("run_energy/samples", samples_key, lambda: merge_samples(list(file_keys)))
+        start = pd.to_datetime(todo["start_ts"]).to_numpy("datetime64[ns]").astype(np.int64) / 1e9
+        end = pd.to_datetime(todo["end_ts"]).to_numpy("datetime64[ns]").astype(np.int64) / 1e9
+        energy, _ = integrate_windows(t, p, start, end)
+        # only the database's current runs are kept
+        known = {k: known[k] for k, n in zip(keys, new) if not n}
+        known.update(zip((k for k, n in zip(keys, new) if n), energy.tolist()))
+        cache.put("run_energy/windows", samples_key, known)
+
+    runs = runs[["id", "pattern", "language"]].copy()
+    runs["energy_j"] = [known[k] for k in keys]
+    return runs
+
+
+# ==============================
+# 3. AGGREGATE
+# ==============================
+
+def stage_aggregate(cache, exec_df, power_df, run_energy):
+    """analysis.compute_energy per (pattern, language) group, plus the mean
+    per-window energy of the group's runs."""
+    rows = []
+    for (pattern, language), ex in exec_df.groupby(["pattern", "language"], sort=False):
+        pw = power_df[(power_df["pattern"] == pattern) & (power_df["language"] == language)]
+        runs = run_energy[(run_energy["pattern"] == pattern)
+                          & (run_energy["language"] == language)]["energy_j"].dropna()
+        key = digest(ex, pw, runs.to_numpy().tobytes(), analysis.emission_factor)
+
+        def compute():
+            out = analysis.compute_energy(ex, pw)
+            out["window_energy_j"] = runs.mean() if len(runs) else np.nan
+            out["window_runs"] = len(runs)
+            return out
+        rows.append(cache.get(f"aggregate/{pattern}_{language}", key, compute))
+    return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+
+# ==============================
+# 4. STATS
+# ==============================
+
+def stage_stats(cache, merged):
+    def compute():
+        out = analysis.add_language_diff(merged.copy())
+        return out, analysis.correlation(out)
+    merged, corr = cache.get("stats", digest(merged), compute)
+    cache.file(RESULTS_CSV, digest(merged), lambda path: merged.to_csv(path, index=False))
+    return merged, corr
+
+
+# ==============================
+# 5. PLOTS
+# ==============================
+
+def stage_plots(cache, merged):
+    groups = merged[["pattern", "language"]]
+    for path, (column, *_) in analysis.CHARTS.items():
+        key = digest(pd.concat([groups, merged[[column]]], axis=1))
+        cache.file(path, key, lambda p: analysis.plot_comparison(merged, p))
+    key = digest(merged[["language", "energy_j"]])
+    cache.file("overall_energy.png", key, lambda p: analysis.plot_overall(merged, p))
+
+
+if __name__ == "__main__":
+
+    cache = Cache(force="--force" in sys.argv)
+
+    exec_df = analysis.load_execution_summary(EXEC_SUMMARY)
+    power_df, file_keys = stage_ingest(cache)
+    run_energy = stage_run_energy(cache, file_keys)
+    merged = stage_aggregate(cache, exec_df, power_df, run_energy)
+    merged, corr = stage_stats(cache, merged)
+    stage_plots(cache, merged)
+    cache.save()
+
+    print(merged[["pattern", "language", "energy_j", "window_energy_j", "energy_diff_vs_java_%"]])
+    print("\nCorrelation between Execution Time and Energy:", round(corr, 3))
+    print(f"\nrecomputed: {', '.join(cache.misses) or 'nothing'}")
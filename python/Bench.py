@@ -0,0 +1,205 @@
+# Run: python Bench.py [strategy|observer|decorator ...] [--messages=N]
+#   [--args="runner options"] [--warmup-min=N] [--warmup-max=N] [--steady-cv=F]
+#   [--reps-min=N] [--reps-max=N] [--ci=F] [--cooldown-max=S] [--cooldown-s=S]
+#   [--temp-tol=C] [--power-tol=F]
+#
+# Benchmark driver that replaces the fixed 30 reps / 30 s / 180 s loop of
+# run_python.ps1. For every pattern it:
+#   1. runs warm-up iterations (not saved) until the last few run times are
+#      steady (coefficient of variation below --steady-cv),
+#   2. repeats measured runs (saved by the runner) until the 95% confidence
+#      interval of time and, when metered, energy is within --ci of the mean,
+#   3. between runs cools down until CPU temperature or package power is back
+#      at the idle baseline taken at startup, instead of sleeping a fixed time.
+# Each run is a separate runner process, as with the PowerShell script.
+
+import sys, os, json, math, time, shlex, statistics, subprocess
+from Common import cli_args
+from Energy import EnergyMeter, energy_source
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RUNNERS = {"strategy": "Strategy.py", "observer": "Observer.py", "decorator": "Decorator.py"}
+
+# two-sided 95% Student t critical values for df = 1..30
+T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def t95(df):
+    return T95[df - 1] if df <= len(T95) else 1.96
+
+
+def cv(xs):
+    if len(xs) < 2:
+        return math.inf   # one run says nothing about spread
+    m = statistics.fmean(xs)
+    return statistics.stdev(xs) / m if m else 0.0
+
+
+def ci_rel(xs):
+    """Half-width of the 95% CI of the mean, relative to the mean."""
+    if len(xs) < 2:
+        return math.inf
+    m = statistics.fmean(xs)
+    hw = t95(len(xs) - 1) * statistics.stdev(xs) / math.sqrt(len(xs))
+    return hw / m if m else 0.0
+
+
+# ---------------- COOL-DOWN SENSORS ----------------
+def cpu_temp():
+    """Hottest CPU sensor in °C, or None where there is none (e.g. Windows)."""
+    if psutil is None or not hasattr(psutil, "sensors_temperatures"):
+        return None
+    temps = [t.current for name, ts in psutil.sensors_temperatures().items()
+             if name in ("coretemp", "k10temp", "zenpower", "cpu_thermal", "acpitz")
+             for t in ts]
+    return max(temps) if temps else None
+
+
+def package_power(source, window=0.5):
+    if source is None:
+        return None
+    meter = EnergyMeter(source).start()
+    time.sleep(window)
+    meter.stop()
+    return meter.watts
+
+
+class Cooldown:
+    """Waits until temperature or power is back within tolerance of the
+    idle baseline measured when the driver started."""
+
+    def __init__(self, temp_tol=2.0, power_tol=0.10, max_wait=120.0, fallback=0.0, poll=0.5):
+        self.temp_tol, self.power_tol = temp_tol, power_tol
+        self.max_wait, self.fallback, self.poll = max_wait, fallback, poll
+        self.source = energy_source("auto")
+        self.base_temp = self._settled(cpu_temp)
+        self.base_power = self._settled(lambda: package_power(self.source))
+
+    def _settled(self, read, n=4):
+        # idle baseline: lowest of a few readings
+        vals = []
+        for _ in range(n):
+            v = read()
+            if v is None:
+                return None
+            vals.append(v)
+            time.sleep(self.poll)
+        return min(vals)
+
+    def _cool(self):
+        # a sensor that stops answering does not count as cool
+        if self.base_temp is not None:
+            temp = cpu_temp()
+            if temp is not None and temp <= self.base_temp + self.temp_tol:
+                return True
+        if self.base_power is not None:
+            power = package_power(self.source)
+            if power is not None and power <= self.base_power * (1 + self.power_tol):
+                return True
+        return False
+
+    def wait(self):
+        """Returns the seconds spent waiting."""
+        t0 = time.monotonic()
+        if self.base_temp is None and self.base_power is None:
+            time.sleep(self.fallback)   # no sensors: fixed pause
+        else:
+            while not self._cool() and time.monotonic() - t0 < self.max_wait:
+                time.sleep(self.poll)
+        return time.monotonic() - t0
+
+    def close(self):
+        if self.source:
+            self.source.close()
+
+
+# ---------------- RUNS ----------------
+def run_once(runner, messages, extra, save):
+    cmd = [sys.executable, RUNNERS[runner], str(messages)] + extra
+    if not save:
+        cmd.append("--no-save")
+    out = subprocess.run(cmd, cwd=HERE, capture_output=True, text=True, check=True).stdout
+    return result_line(out)
+
+
+def result_line(out):
+    # the runner's JSON result; anything else it prints is skipped
+    for line in reversed(out.splitlines()):
+        if line.startswith("{"):
+            try:
+                r = json.loads(line)
+            except ValueError:
+                continue
+            if "elapsed_ms" in r:
+                return r
+    raise ValueError(f"no result line in runner output:\n{out}")
+
+
+def bench(runner, messages, extra, opts, cooldown):
+    window = max(2, int(opts.get("warmup_min", 5)))   # cv needs two runs
+    warmup_max = int(opts.get("warmup_max", 20))
+    steady_cv = float(opts.get("steady_cv", 0.05))
+    reps_min = int(opts.get("reps_min", 5))
+    reps_max = int(opts.get("reps_max", 30))
+    target = float(opts.get("ci", 0.02))
+
+    # -------- WARM-UP (not saved) --------
+    warm = []
+    while len(warm) < warmup_max:
+        warm.append(run_once(runner, messages, extra, save=False)["elapsed_ms"])
+        if len(warm) >= window and cv(warm[-window:]) <= steady_cv:
+            break
+    steady = len(warm) >= window and cv(warm[-window:]) <= steady_cv
+
+    # -------- MEASURED RUNS --------
+    times, energy, cooled = [], [], 0.0
+    while len(times) < reps_max:
+        if times:
+            cooled += cooldown.wait()
+        r = run_once(runner, messages, extra, save=True)
+        times.append(r["elapsed_ms"])
+        if r.get("energy_j"):
+            energy.append(r["energy_j"])
+        print(f"{runner} run {len(times)}: {r['elapsed_ms']:.1f} ms, "
+              f"time CI ±{ci_rel(times):.1%}", file=sys.stderr)
+        if len(times) >= reps_min and ci_rel(times) <= target \
+                and (not energy or ci_rel(energy) <= target):
+            break
+
+    return {
+        "pattern": runner,
+        "messages": messages,
+        "warmup_runs": len(warm),
+        "steady": steady,
+        "runs": len(times),
+        "elapsed_ms_mean": statistics.fmean(times),
+        "elapsed_ms_ci_rel": ci_rel(times),
+        "energy_j_mean": statistics.fmean(energy) if energy else None,
+        "energy_j_ci_rel": ci_rel(energy) if energy else None,
+        "converged": ci_rel(times) <= target and (not energy or ci_rel(energy) <= target),
+        "cooldown_s": cooled,
+    }
+
+
+if __name__ == "__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    runners = args or list(RUNNERS)
+    messages = int(opts.get("messages", 100000))
+    extra = shlex.split(opts.get("args", "")) if opts.get("args") is not True else []
+
+    cooldown = Cooldown(float(opts.get("temp_tol", 2.0)), float(opts.get("power_tol", 0.10)),
+                        float(opts.get("cooldown_max", 120)), float(opts.get("cooldown_s", 0)))
+
+    for i, runner in enumerate(runners):
+        if i:
+            cooldown.wait()
+        print(json.dumps(bench(runner, messages, extra, opts, cooldown)))
+    cooldown.close()
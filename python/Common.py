@@ -1,14 +1,318 @@
-import json, random, time
+import json, random, time, sys, struct
+from array import array
+from datetime import datetime
 from typing import List, Dict
-def gen_message(metrics_count:int, idx:int) -> str:
+from ResultsStore import ResultsStore
+try:
+    import numpy as np
+except ImportError:   # only the batch API needs numpy
+    np = None
+def gen_message(metrics_count:int, idx:int, ts:int=None) -> str:
     r = random.Random(idx)
-    m = {"id":f"t-{idx}","ts":int(time.time()*1000),"metrics":[r.random() for _ in range(metrics_count)]}
+    if ts is None: ts = int(time.time()*1000)
+    m = {"id":f"t-{idx}","ts":ts,"metrics":[r.random() for _ in range(metrics_count)]}
+    # always stdlib json, so every codec is timed on identical input bytes
     return json.dumps(m)
 
-def parse(json_s:str) -> Dict:
-    return json.loads(json_s)
+# ---------------- CODECS ----------------
+# name -> (loads, dumps, dumps_bytes); dumps returns str, dumps_bytes utf-8
+# bytes for the buffered sinks. Optional codecs are only registered when
+# their package is installed.
+CODECS = {"json": (json.loads, json.dumps, lambda o: json.dumps(o).encode())}
+
+try:
+    import orjson
+    CODECS["orjson"] = (orjson.loads, lambda o: orjson.dumps(o).decode(), orjson.dumps)
+except ImportError:
+    pass
+try:
+    import ujson
+    CODECS["ujson"] = (ujson.loads, ujson.dumps, lambda o: ujson.dumps(o).encode())
+except ImportError:
+    pass
+try:
+    import msgspec
+    _ms_enc, _ms_dec = msgspec.json.Encoder(), msgspec.json.Decoder()
+    CODECS["msgspec"] = (_ms_dec.decode, lambda o: _ms_enc.encode(o).decode(), _ms_enc.encode)
+except ImportError:
+    pass
+
+_loads, _dumps, _dumps_b = CODECS["json"]
+# codecs that decode straight from a memoryview (Input.py hands lines on as
+# memoryviews); the others get bytes
+BUFFER_CODECS = {"orjson", "msgspec"}
+_loads_buffers = False
+
+def set_codec(name:str) -> str:
+    """Select the codec behind parse/serialize and return the one in use.
+    "auto" picks the fastest installed one; unknown or missing codecs fall
+    back to stdlib json."""
+    global _loads, _dumps, _dumps_b, _loads_buffers
+    if name == "auto":
+        name = next(n for n in ("orjson", "msgspec", "ujson", "json") if n in CODECS)
+    if name not in CODECS:
+        print(f"codec {name!r} not available, using json", file=sys.stderr)
+        name = "json"
+    _loads, _dumps, _dumps_b = CODECS[name]
+    _loads_buffers = name in BUFFER_CODECS
+    return name
+
+def gen_message_binary(metrics_count:int, idx:int, ts:int=None) -> bytes:
+    # same record as gen_message, in the binary wire format
+    r = random.Random(idx)
+    if ts is None: ts = int(time.time()*1000)
+    return encode_binary({"id":f"t-{idx}","ts":ts,"metrics":[r.random() for _ in range(metrics_count)]})
+
+GENERATORS = {"json": gen_message, "binary": gen_message_binary}
+
+# ---------------- BULK GENERATOR ----------------
+# Metrics of message idx are draws [idx*stride, idx*stride + metrics) of one
+# Philox stream, stride being metrics rounded up to the 4 words Philox makes
+# per counter step. Philox is counter-based, so starting it at counter
+# idx*stride/4 gives exactly message idx's values: a block of messages is a
+# single random() call, and any one message can still be regenerated alone.
+GEN_KEY = 0x7E1E
+GEN_BLOCK = 4096
+
+def gen_metrics(metrics_count:int, start:int, n:int):
+    """(n, metrics_count) float64 array of the metrics of messages [start, start+n)."""
+    if np is None:
+        raise RuntimeError("the bulk generator requires numpy")
+    q = -(-metrics_count // 4)
+    g = np.random.Generator(np.random.Philox(key=GEN_KEY, counter=start * q))
+    return g.random((n, 4 * q))[:, :metrics_count]
+
+class BulkGenerator:
+    """Index-seeded messages made a block at a time from gen_metrics.
+    Calling it works like gen_message (one message, served from the current
+    block); messages() returns a whole range. Output is JSON strings, as
+    gen_message writes them, or binary wire-format bytes."""
+
+    def __init__(self, fmt:str="json", block:int=GEN_BLOCK, stop:int=None, ts:int=None):
+        self.fmt = fmt
+        self.block = block
+        self.stop = stop      # no block runs past it
+        self.ts = ts          # fixed ts; default: the time each block is made
+        self._start, self._msgs = 0, []
+
+    def messages(self, metrics_count:int, start:int, n:int) -> list:
+        ts = self.ts if self.ts is not None else int(time.time()*1000)
+        m = gen_metrics(metrics_count, start, n)
+        if self.fmt == "binary":
+            return _pack_binary(m, start, ts)
+        # same bytes as json.dumps of the dict, without building the dict
+        return [f'{{"id": "t-{i}", "ts": {ts}, "metrics": [{", ".join(map(repr, row))}]}}'
+                for i, row in enumerate(m.tolist(), start)]
+
+    def __call__(self, metrics_count:int, idx:int):
+        off = idx - self._start
+        if not 0 <= off < len(self._msgs):
+            n = self.block if self.stop is None else max(1, min(self.block, self.stop - idx))
+            self._start, self._msgs = idx, self.messages(metrics_count, idx, n)
+            off = 0
+        return self._msgs[off]
+
+def _pack_binary(m, start:int, ts:int) -> List[bytes]:
+    n, k = m.shape
+    data, rec = m.astype("<f8").tobytes(), 8 * k
+    pack, out = _BIN_HEADER.pack, []
+    for j in range(n):
+        id_b = f"t-{start + j}".encode()
+        out.append(b"".join((pack(BIN_MAGIC, len(id_b), k, 0, ts), id_b,
+                             bytes(-len(id_b) % 8), data[j*rec:(j+1)*rec])))
+    return out
+
+def make_generator(opts:Dict, stop:int=None):
+    # --gen=bulk selects BulkGenerator; the default stays gen_message
+    fmt = opts.get("format", "json")
+    if opts.get("gen", "message") == "bulk":
+        return BulkGenerator(fmt, int(opts.get("gen_block", GEN_BLOCK)), stop)
+    return GENERATORS[fmt]
+
+# ---------------- BINARY WIRE FORMAT ----------------
+# header: magic, id length, metrics count, reserved, ts (24 bytes, little-endian)
+# then the utf-8 id padded to 8 bytes, then the metrics as packed float64.
+# Decoding is zero-copy: "metrics" is a memoryview over the message buffer.
+BIN_MAGIC = b"TLM1"
+_BIN_HEADER = struct.Struct("<4sIIIq")
+_LITTLE = sys.byteorder == "little"
+
+def encode_binary(t:Dict) -> bytes:
+    id_b = str(t["id"]).encode()
+    metrics = array("d", t.get("metrics", []))
+    if not _LITTLE:
+        metrics.byteswap()
+    return b"".join((_BIN_HEADER.pack(BIN_MAGIC, len(id_b), len(metrics), 0, t["ts"]),
+                     id_b, bytes(-len(id_b) % 8), metrics.tobytes()))
+
+def _decode_binary(buf):
+    mv = memoryview(buf)
+    _, id_len, n, _, ts = _BIN_HEADER.unpack_from(mv)
+    off = _BIN_HEADER.size + id_len + (-id_len % 8)
+    metrics = mv[off:off + 8 * n].cast("d")
+    if not _LITTLE:
+        metrics = array("d", metrics.tobytes()); metrics.byteswap()
+    return str(mv[_BIN_HEADER.size:_BIN_HEADER.size + id_len], "utf-8"), ts, metrics
+
+def decode_binary(buf) -> Dict:
+    id_, ts, metrics = _decode_binary(buf)
+    return {"id": id_, "ts": ts, "metrics": metrics}
+
+def message_metrics(m) -> int:
+    # metrics count of one encoded message in either format; corpora and
+    # --input fix it in the data instead of taking it from the command line
+    if type(m) is not str and m[:4] == BIN_MAGIC:
+        return _BIN_HEADER.unpack_from(m)[2]
+    return len(json.loads(bytes(m) if type(m) is memoryview else m).get("metrics", ()))
+
+# ---------------- RECORDS ----------------
+# parse() returns dicts by default. set_record("telemetry") makes it return
+# Telemetry records instead: a few slots and the metrics packed in one
+# array('d') (a memoryview over the message for the binary format), so a
+# decoded message holds no per-metric float objects. Dicts are only built
+# again at the edges, by serialize().
+
+_FIELDS = ("id", "ts", "metrics", "avg")
+_KNOWN = frozenset(_FIELDS)
+_FLOAT = {float}
+_SLOT = object()   # extra entry whose value lives in the slot of that name
+
+def _metrics_list(m):
+    return m if type(m) is list else list(m) if type(m) is tuple else m.tolist()
+
+class Telemetry:
+    """A decoded message. Supports the dict access the processors use
+    (t["avg"], t.get("metrics"), "avg" in t), so it can stand in for the
+    dict records; a slot that is None, such as avg until it is computed,
+    is missing. A message with other fields, explicit nulls or its fields
+    in another order also gets extra, all its keys in order, so to_dict()
+    gives back what a dict record would hold."""
+    __slots__ = ("id", "ts", "metrics", "avg", "extra")
+
+    def __init__(self, id, ts, metrics, avg=None, extra=None):
+        self.id = id
+        self.ts = ts
+        self.metrics = metrics
+        self.avg = avg
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, d:Dict) -> "Telemetry":
+        get = d.get
+        m = get("metrics")
+        # only all-float metrics are packed; ints would come back as floats
+        if m is not None and _FLOAT.issuperset(map(type, m)):
+            m = array("d", m)
+        t = cls(get("id"), get("ts"), m, get("avg"))
+        if tuple(d) != _FIELDS[:len(d)] or None in d.values():
+            t.extra = {k: _SLOT if k in _KNOWN and v is not None else v for k, v in d.items()}
+            t.extra.setdefault("avg", _SLOT)   # computed next, so it goes last, as in a dict
+        return t
+
+    def _field(self, k):
+        v = getattr(self, k)
+        return _metrics_list(v) if k == "metrics" and v is not None else v
+
+    def to_dict(self) -> Dict:
+        d = {}
+        if self.extra:
+            for k, v in self.extra.items():
+                if v is _SLOT:
+                    v = self._field(k)
+                    if v is None:
+                        continue
+                d[k] = v
+        for k in _FIELDS:
+            if k not in d:
+                v = self._field(k)
+                if v is not None:
+                    d[k] = v
+        return d
+
+    def copy(self) -> "Telemetry":
+        m = self.metrics
+        if m is not None:
+            m = list(m) if type(m) in (list, tuple) else array("d", m)
+        return Telemetry(self.id, self.ts, m, self.avg, self.extra and dict(self.extra))
+
+    def keys(self):
+        return list(self.to_dict()) if self.extra else \
+            [k for k in _FIELDS if getattr(self, k) is not None]
+
+    def __getitem__(self, key):
+        v = getattr(self, key) if key in _KNOWN else None
+        if v is None:
+            v = self.extra.get(key, _SLOT) if self.extra else _SLOT
+            if v is _SLOT:
+                raise KeyError(key)
+        return v
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if key in _KNOWN:
+            setattr(self, key, value)
+            if self.extra:
+                self.extra[key] = _SLOT
+        elif self.extra is None:
+            self.extra = {k: _SLOT for k in self.keys()}
+            self.extra[key] = value
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, Telemetry):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return f"Telemetry({self.to_dict()!r})"
+
+_as_telemetry = False
+
+def set_record(name:str) -> str:
+    """Select what parse() returns, "dict" or "telemetry", and return it."""
+    global _as_telemetry
+    if name not in ("dict", "telemetry"):
+        print(f"record type {name!r} not available, using dict", file=sys.stderr)
+        name = "dict"
+    _as_telemetry = name == "telemetry"
+    return name
+
+def parse(json_s) -> Dict:
+    # binary messages are recognised by their magic; everything else is JSON
+    if type(json_s) is not str and json_s[:4] == BIN_MAGIC:
+        if _as_telemetry:
+            return Telemetry(*_decode_binary(json_s))
+        return decode_binary(json_s)
+    if type(json_s) is memoryview and not _loads_buffers:
+        json_s = json_s.tobytes()
+    if _as_telemetry:
+        return Telemetry.from_dict(_loads(json_s))
+    return _loads(json_s)
 
 def transform_compute_avg(t:Dict) -> float:
+    if type(t) is Telemetry:
+        m = t.metrics
+        t.avg = sum(m) / len(m) if m else 0.0
+        return t.avg
     arr = t.get("metrics", [])
     if not arr: t["avg"]=0.0; return 0.0
     s = sum(arr)
@@ -16,4 +320,109 @@ def transform_compute_avg(t:Dict) -> float:
     return t["avg"]
 
 def serialize(t:Dict) -> str:
-    return json.dumps(t)
+    if type(t) is Telemetry:
+        return _dumps(t.to_dict())
+    m = t.get("metrics")
+    if type(m) is memoryview or type(m) is array:   # decoded from the binary format
+        t = dict(t, metrics=m.tolist())
+    return _dumps(t)
+
+def serialize_bytes(t:Dict) -> bytes:
+    if type(t) is Telemetry:
+        return _dumps_b(t.to_dict())
+    m = t.get("metrics")
+    if type(m) is memoryview or type(m) is array:
+        t = dict(t, metrics=m.tolist())
+    return _dumps_b(t)
+
+# ---------------- BATCH API ----------------
+# N messages at a time, metrics packed into one contiguous (N, metrics)
+# float64 array so averaging and filtering are single vectorized operations.
+
+class Batch:
+    __slots__ = ("ids", "ts", "metrics", "avg")
+
+    def __init__(self, ids, ts, metrics, avg=None):
+        self.ids = ids
+        self.ts = ts
+        self.metrics = metrics
+        self.avg = avg
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, mask) -> "Batch":
+        idx = np.flatnonzero(mask).tolist()
+        return Batch([self.ids[i] for i in idx], [self.ts[i] for i in idx],
+                     self.metrics[mask], None if self.avg is None else self.avg[mask])
+
+def gen_batch(metrics_count:int, start:int, n:int, gen=gen_message) -> List[str]:
+    if isinstance(gen, BulkGenerator):
+        return gen.messages(metrics_count, start, n)
+    return [gen(metrics_count, i) for i in range(start, start + n)]
+
+def parse_batch(json_list:List[str]) -> Batch:
+    if np is None:
+        raise RuntimeError("batch mode requires numpy")
+    recs = [parse(s) for s in json_list]
+    if not recs:
+        return Batch([], [], np.empty((0, 0)))
+    # all messages of a batch must carry the same number of metrics
+    first = recs[0].get("metrics")
+    if type(first) is memoryview or type(first) is array:
+        # binary messages: concatenate the raw float64 buffers
+        metrics = np.frombuffer(b"".join(t["metrics"] for t in recs), dtype=np.float64)
+    else:
+        metrics = np.array([t.get("metrics", []) for t in recs], dtype=np.float64)
+    return Batch([t["id"] for t in recs], [t["ts"] for t in recs], metrics.reshape(len(recs), -1))
+
+def transform_compute_avg_batch(b:Batch):
+    # summed left to right like sum() in transform_compute_avg, so batch and
+    # per-message runs write the same avg (mean() sums pairwise and can
+    # differ in the last bit, flipping records at the threshold)
+    m = b.metrics
+    n = m.shape[1]
+    b.avg = np.cumsum(m, axis=1)[:, -1] / n if n else np.zeros(m.shape[0])
+    return b.avg
+
+def threshold_mask(b:Batch, threshold:float):
+    return b.avg >= threshold
+
+def serialize_batch(b:Batch, enc=serialize) -> List[str]:
+    if b.avg is None:
+        return [enc({"id":i, "ts":ts, "metrics":m})
+                for i, ts, m in zip(b.ids, b.ts, b.metrics.tolist())]
+    return [enc({"id":i, "ts":ts, "metrics":m, "avg":a})
+            for i, ts, m, a in zip(b.ids, b.ts, b.metrics.tolist(), b.avg.tolist())]
+
+# ---------------- RESULTS ----------------
+def wall_ts(t:float) -> str:
+    # local wall-clock time, like the Date/Time columns of HWiNFO logs
+    return datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+def save_result(row:Dict, opts:Dict=None):
+    # one run -> one benchmark_results row; keys are column names.
+    # --no-save skips it; --emit-row prints it for a driver that stores
+    # rows itself (Sweep.py batches them); --db=PATH picks the database.
+    opts = opts or {}
+    if "no_save" in opts:
+        return
+    if "emit_row" in opts:
+        print(json.dumps({"row": row}))
+        return
+    try:
+        with ResultsStore(opts.get("db")) as store:
+            store.insert(row)
+    except Exception as e:
+        print("Database error:", e, file=sys.stderr)
+
+def cli_args(argv:List[str]):
+    # positional args stay as before; switches are given as --name or --name=value
+    args, opts = [], {}
+    for a in argv:
+        if a.startswith("--"):
+            k, _, v = a[2:].partition("=")
+            opts[k.replace("-", "_")] = v if v else True
+        else:
+            args.append(a)
+    return args, opts
@@ -0,0 +1,116 @@
+# Build: python Corpus.py build PATH [messages] [metrics] [--format=json|binary] [--workers=N] [--ts0=MS]
+# Info:  python Corpus.py info PATH
+#
+# A corpus is the message stream generated once, ahead of the benchmark:
+#   PATH      the messages back to back (JSON corpora are also valid NDJSON)
+#   PATH.idx  len+1 little-endian uint64 offsets; message i is [off[i], off[i+1])
+# Timestamps are ts0 + idx, so the same arguments always give the same bytes
+# and Java and Python runs can replay identical input.
+
+import sys, os, mmap, time
+from array import array
+from multiprocessing import Pool
+from Common import GENERATORS, BIN_MAGIC, cli_args, message_metrics
+
+TS0 = 1_700_000_000_000
+CHUNK = 50_000
+_LITTLE = sys.byteorder == "little"
+
+
+def _gen_chunk(job):
+    fmt, metrics, start, stop, ts0 = job
+    gen = GENERATORS[fmt]
+    sep = b"\n" if fmt == "json" else b""
+    parts, lengths = [], array("Q")
+    for i in range(start, stop):
+        m = gen(metrics, i, ts0 + i)
+        if fmt == "json":
+            m = m.encode()
+        parts.append(m)
+        lengths.append(len(m) + len(sep))
+    parts.append(b"")
+    return sep.join(parts), lengths
+
+
+def build(path, messages, metrics, fmt="json", workers=None, ts0=TS0, chunk=CHUNK):
+    if messages <= 0:
+        raise ValueError(f"a corpus needs at least one message, not {messages}")
+    jobs = [(fmt, metrics, s, min(s + chunk, messages), ts0) for s in range(0, messages, chunk)]
+    offsets = array("Q", [0])
+    with open(path, "wb") as data, Pool(workers) as pool:
+        # imap keeps chunk order, so the file does not depend on the worker count
+        for blob, lengths in pool.imap(_gen_chunk, jobs):
+            data.write(blob)
+            pos = offsets[-1]
+            for n in lengths:
+                pos += n
+                offsets.append(pos)
+    if not _LITTLE:
+        offsets.byteswap()
+    with open(path + ".idx", "wb") as f:
+        offsets.tofile(f)
+    return messages
+
+
+class Corpus:
+    """Memory-mapped replay of a corpus built by build()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._files = [open(path, "rb"), open(path + ".idx", "rb")]
+        # mmap cannot map an empty file; an empty corpus replays nothing
+        size = os.fstat(self._files[0].fileno()).st_size
+        self._data = mmap.mmap(self._files[0].fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._idx = mmap.mmap(self._files[1].fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = memoryview(self._idx).cast("Q")
+        if not _LITTLE:
+            self.offsets = array("Q", self._idx); self.offsets.byteswap()
+        self.format = "binary" if self._data[:4] == BIN_MAGIC else "json"
+        # fixed at build time; taken from the first message
+        self.metrics = message_metrics(self[0]) if len(self) else 0
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self._data[self.offsets[i]:self.offsets[i + 1]]
+
+    def gen(self, metrics_count, idx):
+        # same signature as Common's generators; metrics_count must be the
+        # corpus's own, since it is fixed at build time
+        if metrics_count != self.metrics:
+            raise ValueError(f"corpus has {self.metrics} metrics per message, not {metrics_count}")
+        return self._data[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def close(self):
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._idx.close()
+        for f in self._files:
+            f.close()
+
+
+if __name__ == "__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    cmd = args[0] if args else "info"
+    path = args[1] if len(args) > 1 else "corpus.ndjson"
+
+    if cmd == "build":
+        messages = int(args[2]) if len(args) > 2 else 100000
+        metrics = int(args[3]) if len(args) > 3 else 50
+        workers = int(opts["workers"]) if "workers" in opts else None
+        start = time.perf_counter()
+        try:
+            build(path, messages, metrics, opts.get("format", "json"), workers, int(opts.get("ts0", TS0)))
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"{messages} messages -> {path} ({os.path.getsize(path)} bytes) "
+              f"in {time.perf_counter() - start:.2f} s")
+    else:
+        c = Corpus(path)
+        print(f"{path}: {len(c)} {c.format} messages of {c.metrics} metrics, "
+              f"{os.path.getsize(path)} bytes")
+        c.close()
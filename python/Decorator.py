@@ -1,17 +1,42 @@
 # Run: python decorator.py [messages] [metrics] [sink]
-import sys, time, json, os, sqlite3
+#   [--chain=string|record] [--depth=N] [--threshold=F] [--batch=N]
+#   [--codec=NAME] [--format=json|binary] [--gen=message|bulk] [--corpus=PATH]
+#   [--input=SPEC] [--workers=N [--merge]] [--buffered] [--flush-records=N]
+#   [--flush-bytes=N] [--flush-ms=N] [--sink-thread] [--latency] [--memory[=gc]]
+#   [--energy=auto|rapl|fake|none] [--record=dict|telemetry] [--no-save]
+#   [--db=PATH] [--layers] [--cores=LIST]
+import sys, time, json, os
+from functools import partial
 from datetime import datetime
-from Common import gen_message, parse, transform_compute_avg, serialize
+from Common import (parse, transform_compute_avg, serialize, cli_args, wall_ts,
+                    set_codec, set_record, save_result, make_generator,
+                    gen_batch, parse_batch, transform_compute_avg_batch, threshold_mask)
+from Corpus import Corpus
+from Input import Input
+from Workers import run_sharded, pin_cores
+from Sink import open_sink, sink_policy
+from Energy import EnergyMeter, energy_source
+from Latency import LatencyRecorder, timed, merged
+from Memory import MemoryMeter, traced, merge_meters
+from LayerProfile import LayerProfile, merge_stats, report, format_report
 
 class Processor:
     def process(self, json_s): raise NotImplementedError
+    # record-passing chain: t is an already decoded dict
+    def process_record(self, t): raise NotImplementedError
+    # batch chain: b is a Common.Batch, decoded once by the caller
+    def process_batch(self, b): raise NotImplementedError
 
 class CoreProcessor(Processor):
     def __init__(self, sink_file):
-        self.sink = open(sink_file, "a")
+        self.sink = open_sink(sink_file)
     def process(self, json_s):
         t = parse(json_s)
-        self.sink.write(serialize(t) + "\n")
+        self.sink.write_record(t)
+    def process_record(self, t):
+        self.sink.write_record(t)
+    def process_batch(self, b):
+        self.sink.write_batch(b)
     def close(self): self.sink.close()
 
 class TransformDecorator(Processor):
@@ -21,6 +46,12 @@ class TransformDecorator(Processor):
         t = parse(json_s)
         transform_compute_avg(t)
         self.wrap.process(serialize(t))
+    def process_record(self, t):
+        transform_compute_avg(t)
+        self.wrap.process_record(t)
+    def process_batch(self, b):
+        transform_compute_avg_batch(b)
+        self.wrap.process_batch(b)
 
 class FilterDecorator(Processor):
     def __init__(self, wrap, threshold=0.5):
@@ -30,61 +61,215 @@ class FilterDecorator(Processor):
         transform_compute_avg(t)
         if t["avg"] >= self.threshold:
             self.wrap.process(serialize(t))
+    def process_record(self, t):
+        transform_compute_avg(t)
+        if t["avg"] >= self.threshold:
+            self.wrap.process_record(t)
+    def process_batch(self, b):
+        transform_compute_avg_batch(b)
+        self.wrap.process_batch(b.take(threshold_mask(b, self.threshold)))
 
-if __name__=="__main__":
+class RecordChain(Processor):
+    """Head of a record-passing chain: decodes the message once and hands
+    the dict down, so only CoreProcessor serializes it again."""
+    def __init__(self, wrap):
+        self.wrap = wrap
+    def process(self, json_s):
+        self.wrap.process_record(parse(json_s))
+    def process_batch(self, b):
+        self.wrap.process_batch(b)
+
+def run(start, stop, sink, metrics, opts, meter=None):
+    """Process messages [start, stop) into sink; returns {"elapsed_ms": loop time, ...}.
+    meter, if given, is an Energy.EnergyMeter run around the timed loop."""
+    chain = opts.get("chain", "string")   # "string" = legacy, "record" = parse once
+    batch = int(opts.get("batch", 0))     # > 1 = vectorized batch path
+    set_codec(opts.get("codec", "json"))
+    set_record(opts.get("record", "dict"))
+    gen = make_generator(opts, stop)
+    if "corpus" in opts:
+        # replay a pre-generated corpus instead of generating in the timed loop
+        gen = Corpus(opts["corpus"]).gen
+    # --input: stream lines from a file or socket instead; [start, stop) is a cap
+    src = Input(opts["input"], stop - start) if "input" in opts else None
 
-    messages = int(sys.argv[1]) if len(sys.argv)>1 else 100000
-    metrics = int(sys.argv[2]) if len(sys.argv)>2 else 50
-    sink = sys.argv[3] if len(sys.argv)>3 else os.devnull
+    core = CoreProcessor(open_sink(sink, sink_policy(opts)))
+    # --depth = number of TransformDecorator layers between filter and core
+    proc = core
+    for _ in range(int(opts.get("depth", 1))):
+        proc = TransformDecorator(proc)
+    proc = FilterDecorator(proc, float(opts.get("threshold", 0.5)))
+    if chain == "record":
+        proc = RecordChain(proc)
 
-    core = CoreProcessor(sink)
-    proc = FilterDecorator(TransformDecorator(core), 0.5)
+    prof = None
+    if "layers" in opts:
+        # per-layer/per-phase time; see LayerProfile.py
+        prof = LayerProfile()
+        prof.instrument(proc)
+        frame_ns = prof.frame_ns()
 
-    start = time.perf_counter()
+    process, process_batch = proc.process, proc.process_batch
+    mem = MemoryMeter(trace=opts["memory"] != "gc") if "memory" in opts else None
+    if mem:
+        process, process_batch = traced(process, mem), traced(process_batch, mem)
+    lat = LatencyRecorder() if "latency" in opts else None
+    if lat:
+        # per process() call; in batch mode one sample is one batch
+        process, process_batch = timed(process, lat), timed(process_batch, lat)
 
-    for i in range(messages):
-        proc.process(gen_message(metrics,i))
+    if mem: mem.start()
+    if meter: meter.start()
+    w0, t0 = time.time(), time.perf_counter()
 
-    end = time.perf_counter()
+    if src is not None:
+        if batch > 1:
+            for b in src.batches(batch):
+                process_batch(parse_batch(b))
+        else:
+            for m in src:
+                process(m)
+    elif batch > 1:
+        for s in range(start, stop, batch):
+            process_batch(parse_batch(gen_batch(metrics, s, min(batch, stop - s), gen)))
+    else:
+        for i in range(start, stop):
+            process(gen(metrics, i))
+
+    t1, w1 = time.perf_counter(), time.time()
+    if meter: meter.stop()
+    if mem: mem.stop(src.count if src is not None else stop - start)
     core.close()
+    out = {"elapsed_ms": (t1-t0)*1000, "window": (w0, w1)}
+    if src is not None:
+        out["messages"] = src.count
+        out["metrics"] = metrics if src.metrics is None else src.metrics
+    if lat:
+        out["latency"] = lat
+    if mem:
+        out["memory"] = mem
+    if prof:
+        prof.uninstall()
+        out["layers"] = {"order": prof.order, "stats": prof.stats, "frame_ns": frame_ns}
+    return out
+
+if __name__=="__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    # with --input, messages caps the lines read (0 or omitted = all of them)
+    messages = int(args[0]) if len(args)>0 else (0 if "input" in opts else 100000)
+    # with --corpus or --input the data fixes the metrics count; a metrics
+    # argument that disagrees with it is an error
+    given = int(args[1]) if len(args)>1 else None
+    metrics = 50 if given is None else given
+    sink = args[2] if len(args)>2 else os.devnull
+    chain = opts.get("chain", "string")
+    batch = int(opts.get("batch", 0))
+    workers = int(opts.get("workers", 1))
+    threshold = float(opts.get("threshold", 0.5))
+    depth = int(opts.get("depth", 1))
+    opts["codec"] = codec = set_codec(opts.get("codec", "json"))
+    opts["record"] = record = set_record(opts.get("record", "dict"))
+    fmt = opts.get("format", "json")
+    if "corpus" in opts:
+        corpus = Corpus(opts["corpus"])
+        if len(corpus) < messages:
+            sys.exit(f"corpus has only {len(corpus)} messages")
+        if given not in (None, corpus.metrics):
+            sys.exit(f"corpus has {corpus.metrics} metrics per message, not {given}")
+        metrics = corpus.metrics
+        fmt = corpus.format
 
-    elapsed_ms = (end-start)*1000
+    if "input" in opts and workers > 1:
+        sys.exit("--input is read by a single process; drop --workers")
+    if "cores" in opts:
+        # before the worker pool starts, so the workers inherit it
+        pin_cores(opts["cores"])
+
+    source = energy_source(opts.get("energy", "auto"))
+    meter = EnergyMeter(source) if source else None
+
+    if workers > 1:
+        # energy is package-wide, so it is metered once around all workers
+        if meter: meter.start()
+        elapsed_ms, results = run_sharded(partial(run, metrics=metrics, opts=opts),
+                                            messages, workers, sink, merge="merge" in opts)
+        if meter: meter.stop()
+    else:
+        results = [run(0, messages, sink, metrics, opts, meter)]
+        elapsed_ms = results[0]["elapsed_ms"]
+        messages = results[0].get("messages", messages)
+        metrics = results[0].get("metrics", metrics)
+        if given not in (None, metrics):
+            sys.exit(f"input has {metrics} metrics per message, not {given}")
+    if source:
+        source.close()
+    worker_ms = [r["elapsed_ms"] for r in results]
+    # wall-clock span of the timed loops, for joining with sensor logs
+    start_ts = wall_ts(min(r["window"][0] for r in results))
+    end_ts = wall_ts(max(r["window"][1] for r in results))
+    lat = merged(results)
+    lat_ms = lat.summary_ms() if lat else {}
+    mem = merge_meters(results)
+    layers = merge_stats(results)
+    if layers:
+        # shards run side by side, so compare with the summed worker time
+        layers = report(layers, sum(worker_ms), meter.joules if meter else 0.0)
+        print(format_report(layers), file=sys.stderr)
 
     # ----------- PRINT RESULT ----------
     print(json.dumps({
         "pattern":"decorator",
         "lang":"python",
         "messages":messages,
-        "elapsed_ms":elapsed_ms
+        "metrics":metrics,
+        "threshold":threshold,
+        "depth":depth,
+        "chain":chain,
+        "batch":batch,
+        "codec":codec,
+        "format":fmt,
+        "gen":opts.get("gen", "message"),
+        **({"input":opts["input"]} if "input" in opts else {}),
+        "record":record,
+        "workers":workers,
+        "elapsed_ms":elapsed_ms,
+        "msgs_per_s":messages / (elapsed_ms / 1000) if elapsed_ms else 0.0,
+        "worker_ms":worker_ms,
+        "energy_source":source.kind if source else "none",
+        "energy_j":meter.joules if meter else 0.0,
+        "average_power_w":meter.watts if meter else 0.0,
+        **({"latency_ms":lat_ms} if lat else {}),
+        **({"memory":mem.summary()} if mem else {}),
+        **({"layers":layers} if layers else {})
     }))
 
     # ----------- INSERT INTO SQLITE ---------------
-    try:
-        conn = sqlite3.connect("../telemetry_results.db")
-        cursor = conn.cursor()
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        average_power = 0.0   # will update later from HWInfo
-        energy = 0.0          # will compute later
-
-        cursor.execute("""
-        INSERT INTO benchmark_results
-        (timestamp, pattern, language, messages,
-         execution_time_ms, average_power_w, energy_j)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            timestamp,
-            "decorator",
-            "python",
-            messages,
-            elapsed_ms,
-            average_power,
-            energy
-        ))
-
-        conn.commit()
-        conn.close()
-
-    except Exception as e:
-        print("Database error:", e)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # 0.0 when no energy source is available (e.g. Windows: use HWInfo)
+    average_power = meter.watts if meter else 0.0
+    energy = meter.joules if meter else 0.0
+
+    save_result({
+        "timestamp": timestamp,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "pattern": "decorator",
+        "language": "python",
+        "messages": messages,
+        "execution_time_ms": elapsed_ms,
+        "average_power_w": average_power,
+        "energy_j": energy,
+        "codec": codec,
+        "workers": workers,
+        "metrics": metrics,
+        "threshold": threshold,
+        "depth": depth,
+        "latency_p50_ms": lat_ms.get("p50"),
+        "latency_p90_ms": lat_ms.get("p90"),
+        "latency_p99_ms": lat_ms.get("p99"),
+        "latency_p999_ms": lat_ms.get("p99.9"),
+        "latency_max_ms": lat_ms.get("max"),
+        **(mem.row() if mem else {})
+    }, opts)
@@ -0,0 +1,207 @@
+# In-process energy measurement for the pattern runners.
+#
+# RaplSource reads the RAPL package counters the Linux powercap driver exposes
+# under /sys/class/powercap; FakeSource simulates a counter so the meter can be
+# tested anywhere (including wraparound). EnergyMeter turns counter readings
+# into joules and watts for one timed region.
+#
+#   python Energy.py check    # wraparound and poller checks on FakeSource
+#   python Energy.py          # reads the --energy source for --seconds
+
+import os, sys, time, threading
+
+POWERCAP = "/sys/class/powercap"
+
+
+class RaplSource:
+    """Top-level RAPL zones (one per CPU package). Subzones such as core or
+    uncore are already included in their package and are not read."""
+    kind = "rapl"
+
+    def __init__(self, root=POWERCAP):
+        self.names, self.max_ranges, self._fds = [], [], []
+        for d in sorted(os.listdir(root)):
+            # intel-rapl:0, amd-rapl:1, ... but not intel-rapl:0:0
+            if d.count(":") != 1:
+                continue
+            path = os.path.join(root, d)
+            try:
+                with open(os.path.join(path, "max_energy_range_uj")) as f:
+                    max_range = int(f.read())
+                with open(os.path.join(path, "name")) as f:
+                    name = f.read().strip()
+                fd = os.open(os.path.join(path, "energy_uj"), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.pread(fd, 32, 0)   # energy_uj is root-only on recent kernels
+            except OSError:
+                os.close(fd)
+                continue
+            self.names.append(name)
+            self.max_ranges.append(max_range)
+            self._fds.append(fd)
+        if not self._fds:
+            raise OSError(f"no readable RAPL zones under {root}")
+
+    def read(self):
+        # microjoules per zone; pread on a kept fd avoids open() per sample
+        return [int(os.pread(fd, 32, 0)) for fd in self._fds]
+
+    def close(self):
+        for fd in self._fds:
+            os.close(fd)
+
+
+class FakeSource:
+    """Counter that grows at `watts` and wraps at max_range (microjoules).
+    `readings` replaces the clock with a fixed sequence of counter values."""
+    kind = "fake"
+
+    def __init__(self, watts=10.0, max_range=2**32, readings=None):
+        self.names = ["fake"]
+        self.max_ranges = [max_range]
+        self.watts = watts
+        self._t0 = time.perf_counter()
+        self._readings = iter(readings) if readings is not None else None
+
+    def read(self):
+        if self._readings is not None:
+            return [next(self._readings)]
+        uj = int((time.perf_counter() - self._t0) * self.watts * 1e6)
+        return [uj % self.max_ranges[0]]
+
+    def close(self):
+        pass
+
+
+def energy_source(name="auto"):
+    """Source for --energy=auto|rapl|fake|none; auto is RAPL when readable."""
+    if name == "none":
+        return None
+    if name == "fake":
+        return FakeSource()
+    try:
+        return RaplSource()
+    except OSError:
+        if name == "rapl":
+            raise
+        return None
+
+
+class EnergyMeter:
+    """Energy used between start() and stop(), summed over all zones.
+
+    A counter wraps at its max_range; one wrap between two readings is
+    undone by adding max_range back. To make sure no counter can wrap twice
+    unnoticed, a background thread also reads the counters every `interval`
+    seconds. By default that is half the time the fastest-wrapping zone
+    needs at MAX_WATTS, which is minutes for real RAPL ranges, so the
+    thread costs next to nothing.
+    """
+    MAX_WATTS = 1000.0
+
+    def __init__(self, source, interval=None):
+        self.source = source
+        if interval is None:
+            interval = min(source.max_ranges) / 1e6 / self.MAX_WATTS / 2
+        self.interval = interval
+        self.joules = 0.0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        # read under the lock so the poller and stop() cannot interleave
+        with self._lock:
+            cur = self.source.read()
+            total = 0
+            for prev, now, max_range in zip(self._prev, cur, self.source.max_ranges):
+                d = now - prev
+                if d < 0:
+                    d += max_range
+                total += d
+            self._uj += total
+            self._prev = cur
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._uj = 0
+        self._stop.clear()
+        self._prev = self.source.read()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def read(self):
+        """Joules since start(), sampling the counters now."""
+        self._sample()
+        return self._uj / 1e6
+
+    def stop(self):
+        self._sample()
+        self.seconds = time.perf_counter() - self._t0
+        self._stop.set()
+        self._thread.join()
+        self.joules = self._uj / 1e6
+        return self.joules
+
+    @property
+    def watts(self):
+        return self.joules / self.seconds if self.seconds else 0.0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def check():
+    """Meter checks on FakeSource; raises AssertionError on a miss."""
+    # one wrap: 900 -> 100 at max_range 1000 is 200 uJ, not -800
+    # (interval=3600 keeps the poller from taking readings of its own)
+    meter = EnergyMeter(FakeSource(max_range=1000, readings=[900, 100]), interval=3600)
+    meter.start()
+    assert meter.stop() == 200e-6, meter.joules
+    print("wrap 900 -> 100 at 1000: 200 uJ")
+
+    # scripted readings through read(): +100, +500 (wrap), +450, +200 (wrap)
+    meter = EnergyMeter(FakeSource(max_range=1000, readings=[900, 0, 500, 950, 150, 150]),
+                        interval=3600).start()
+    got = [round(meter.read() * 1e6) for _ in range(4)]
+    assert got == [100, 600, 1050, 1250], got
+    assert round(meter.stop() * 1e6) == 1250, meter.joules
+    print("scripted readings:", got, "uJ")
+
+    # the poller has to read a counter that wraps every 10 ms often enough
+    # that stop() sees at most one wrap
+    src = FakeSource(watts=10.0, max_range=100_000)
+    with EnergyMeter(src, interval=0.002) as meter:
+        time.sleep(0.3)
+    expected = src.watts * meter.seconds
+    assert abs(meter.joules - expected) <= 0.1 * expected, (meter.joules, expected)
+    print(f"poller: {meter.joules:.3f} J over {meter.seconds:.3f} s "
+          f"({meter.watts:.2f} W, {src.watts:.0f} W simulated)")
+
+
+if __name__ == "__main__":
+
+    from Common import cli_args   # only the CLI needs it; common/Telemetry.py imports this module
+    args, opts = cli_args(sys.argv[1:])
+    if args and args[0] == "check":
+        check()
+    else:
+        source = energy_source(opts.get("energy", "auto"))
+        if source is None:
+            sys.exit("no readable energy source; try --energy=fake")
+        with EnergyMeter(source) as meter:
+            time.sleep(float(opts.get("seconds", 1.0)))
+        source.close()
+        print(f"{source.kind} {','.join(source.names)}: {meter.joules:.3f} J "
+              f"in {meter.seconds:.3f} s = {meter.watts:.2f} W")
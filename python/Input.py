@@ -0,0 +1,184 @@
+# Streamed NDJSON input for the pattern runners (--input=SPEC), so captured
+# traffic can be replayed through the same object graphs as the synthetic
+# messages.
+#
+#   -  or  stdin        standard input
+#   PATH                 file; PATH.gz is gunzipped, PATH.zst needs zstandard
+#   unix:PATH            connect to a Unix socket
+#   tcp:HOST:PORT        connect to a TCP socket
+#
+# Sources are read CHUNK bytes at a time. Every chunk is a fresh bytes
+# object and each line is handed on as a memoryview slice of it, so lines
+# are not copied; only a line cut by a chunk boundary is joined from its
+# pieces. A slice keeps its chunk alive for as long as it is referenced.
+#
+# Serve a file on a loopback socket: python Input.py serve PATH tcp:127.0.0.1:9000
+# Read throughput of a source:      python Input.py cat SPEC
+
+import sys, os, gzip, socket, time, threading
+from itertools import islice, chain
+from Common import cli_args, message_metrics
+
+try:
+    import zstandard
+except ImportError:   # only .zst input needs it
+    zstandard = None
+
+CHUNK = 1 << 20
+
+
+def _open(spec):
+    """(read(n) -> bytes, close()) for an input spec."""
+    if spec in ("-", "stdin"):
+        f = sys.stdin.buffer
+        return getattr(f, "read1", f.read), lambda: None
+    if spec.startswith(("unix:", "tcp:")):
+        kind, _, addr = spec.partition(":")
+        if kind == "unix":
+            if not hasattr(socket, "AF_UNIX"):
+                raise ValueError("Unix sockets are not available on this platform")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(addr)
+        else:
+            host, _, port = addr.rpartition(":")
+            sock = socket.create_connection((host, int(port)))
+        return sock.recv, sock.close
+    if spec.endswith(".gz"):
+        f = gzip.open(spec, "rb")
+        return f.read1, f.close
+    if spec.endswith((".zst", ".zstd")):
+        if zstandard is None:
+            raise RuntimeError("zstd input requires the zstandard package")
+        raw = open(spec, "rb")
+        f = zstandard.ZstdDecompressor().stream_reader(raw, read_size=CHUNK)
+        return f.read, lambda: (f.close(), raw.close())
+    f = open(spec, "rb", buffering=0)
+    return f.read, f.close
+
+
+class Input:
+    """Iterable over the non-empty lines of a source, as memoryviews.
+    limit stops after that many lines; count is the number handed out and
+    metrics the metrics count of the first one."""
+
+    def __init__(self, spec, limit=None, chunk=CHUNK):
+        self.spec = spec
+        self.limit = limit or None
+        self.chunk = chunk
+        self.count = 0
+        self.bytes = 0
+        self.metrics = None
+
+    def _lines(self):
+        read, close = _open(self.spec)
+        size, cut = self.chunk, []   # pieces of a line cut by chunk boundaries
+        try:
+            while True:
+                data = read(size)
+                if not data:
+                    break
+                self.bytes += len(data)
+                mv, find, start = memoryview(data), data.find, 0
+                if cut:
+                    # join only the cut line; the rest of the chunk is sliced
+                    end = find(b"\n")
+                    if end < 0:
+                        cut.append(mv)
+                        continue
+                    cut.append(mv[:end])
+                    yield memoryview(b"".join(cut))
+                    cut, start = [], end + 1
+                while True:
+                    end = find(b"\n", start)
+                    if end < 0:
+                        break
+                    if end > start:
+                        yield mv[start:end]
+                    start = end + 1
+                if start < len(data):
+                    cut.append(mv[start:])
+            if cut:
+                tail = b"".join(cut)
+                if tail.strip():
+                    yield memoryview(tail)
+        finally:
+            close()
+
+    def __iter__(self):
+        lines = self._lines()
+        if self.limit:
+            lines = islice(lines, self.limit)
+        first = next(lines, None)
+        if first is None:
+            return
+        self.metrics = message_metrics(first)
+        for self.count, line in enumerate(chain((first,), lines), 1):
+            yield line
+
+    def batches(self, n):
+        """Lists of up to n lines, for the runners' batch paths."""
+        it = iter(self)
+        while batch := list(islice(it, n)):
+            yield batch
+
+
+# ==============================
+# LOOPBACK SERVER
+# ==============================
+
+def serve(path, spec, ready=None, clients=1):
+    """Send the bytes of path to each of `clients` connections on spec
+    (unix:PATH or tcp:HOST:PORT), one after the other. ready, an optional
+    threading.Event, is set once the socket listens."""
+    kind, _, addr = spec.partition(":")
+    if kind == "unix":
+        if os.path.exists(addr):
+            os.remove(addr)
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        srv.bind(addr)
+    elif kind == "tcp":
+        host, _, port = addr.rpartition(":")
+        srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        srv.bind((host, int(port)))
+    else:
+        raise ValueError(f"cannot serve on {spec!r}; use unix:PATH or tcp:HOST:PORT")
+    with srv:
+        srv.listen(clients)
+        if ready is not None:
+            ready.set()
+        for _ in range(clients):
+            conn, _ = srv.accept()
+            with conn, open(path, "rb") as f:
+                conn.sendfile(f)
+    if kind == "unix":
+        os.remove(addr)
+
+
+def serve_background(path, spec, clients=1):
+    """serve() on a daemon thread; returns once the socket is listening."""
+    ready = threading.Event()
+    t = threading.Thread(target=serve, args=(path, spec, ready, clients), daemon=True)
+    t.start()
+    ready.wait()
+    return t
+
+
+if __name__ == "__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    cmd = args[0] if args else "cat"
+
+    if cmd == "serve":
+        path, spec = args[1], args[2] if len(args) > 2 else "tcp:127.0.0.1:9000"
+        clients = int(opts.get("clients", 1))
+        print(f"serving {path} on {spec} to {clients} client(s)", file=sys.stderr)
+        serve(path, spec, clients=clients)
+    else:
+        src = Input(args[1] if len(args) > 1 else "-")
+        start = time.perf_counter()
+        for _ in src:
+            pass
+        s = time.perf_counter() - start
+        print(f"{src.count} lines, {src.bytes} bytes in {s:.3f} s "
+              f"({src.bytes / 2**20 / s if s else 0.0:.1f} MiB/s)")
@@ -0,0 +1,97 @@
+# Per-call latency recording for the pattern runners (--latency).
+#
+# HDR-histogram style: a fixed array of log-linear buckets. Values below
+# 2**sub_bits ns get one bucket each; above that, every power of two is split
+# into 2**(sub_bits-1) equal buckets, so a reported value is never more than
+# 2**(1-sub_bits) (0.8% at the default 8 bits) above the true one. record()
+# only does integer arithmetic and bumps a counter in the preallocated array,
+# so turning it on does not add allocations to the loop it measures.
+
+import time
+from array import array
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyRecorder:
+    def __init__(self, sub_bits=8, max_ns=60 * 10**9):
+        self.sub_bits = sub_bits
+        self.half = 1 << (sub_bits - 1)
+        self.size = self.index(max_ns) + 1
+        self.counts = array("q", bytes(8 * self.size))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def index(self, ns):
+        e = ns.bit_length() - self.sub_bits
+        if e <= 0:
+            return ns
+        return e * self.half + (ns >> e)
+
+    def record(self, ns):
+        e = ns.bit_length() - self.sub_bits
+        i = ns if e <= 0 else e * self.half + (ns >> e)
+        if i >= self.size:
+            i = self.size - 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def _highest(self, i):
+        # largest value that lands in bucket i
+        if i < 2 * self.half:
+            return i
+        e, top = divmod(i - self.half, self.half)
+        return ((top + self.half + 1) << e) - 1
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(self._highest(i), self.max)
+        return self.max
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def summary_ms(self):
+        out = {f"p{p:g}": self.percentile(p) / 1e6 for p in PERCENTILES}
+        out["max"] = self.max / 1e6
+        out["mean"] = self.total / self.count / 1e6 if self.count else 0.0
+        out["count"] = self.count
+        return out
+
+
+def timed(fn, rec):
+    """Wrap a one-argument call (handle, publish, process) so every call's
+    duration goes into rec."""
+    clock, record = time.perf_counter_ns, rec.record
+
+    def call(arg):
+        t = clock()
+        fn(arg)
+        record(clock() - t)
+    return call
+
+
+def merged(results):
+    # one recorder over all workers' results, or None without --latency
+    recs = [r["latency"] for r in results if "latency" in r]
+    if not recs:
+        return None
+    for other in recs[1:]:
+        recs[0].merge(other)
+    return recs[0]
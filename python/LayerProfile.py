@@ -0,0 +1,219 @@
+# Per-layer cost attribution for decorator chains (--layers).
+#
+# instrument() walks a chain (FilterDecorator -> TransformDecorator ->
+# CoreProcessor -> sink) and replaces every layer's process* methods with a
+# timing wrapper. The helpers the layers call for each phase (parse,
+# transform, serialize, write) are wrapped the same way, so a phase is
+# charged to whichever layer is running when it is called. Every wrapper is
+# a frame on one stack: a frame's self time is its duration minus that of the
+# frames nested in it, which gives exclusive times without double counting.
+
+import sys, time
+from collections import Counter
+
+# module-level helpers the layers call, by phase
+PHASES = {
+    "parse": "parse", "parse_batch": "parse",
+    "transform_compute_avg": "transform", "transform_compute_avg_batch": "transform",
+    "threshold_mask": "transform",
+    "serialize": "serialize",
+}
+LAYER_METHODS = ("process", "process_record", "process_batch")
+SINK_METHODS = ("write_record", "write_encoded", "write_batch")
+ROOT = "(run)"   # phases called by run() itself, outside any layer
+_MISSING = object()
+
+
+class LayerProfile:
+    def __init__(self):
+        self.clock = time.perf_counter_ns
+        self.stack = [0]           # per open frame: ns spent in nested frames
+        self.current = [ROOT]      # innermost running layer
+        self.stats = {}            # (layer, phase or None) -> [calls, inclusive ns, self ns]
+        self.order = [ROOT]        # layers from the outside in
+        self.seen = Counter()      # class name -> layers of that class so far
+        self._patched = []
+
+    def _entry(self, layer, phase):
+        st = self.stats.get((layer, phase))
+        if st is None:
+            st = self.stats[(layer, phase)] = [0, 0, 0]
+        return st
+
+    def _frame(self, fn, layer=None, phase=None):
+        clock, stack, current = self.clock, self.stack, self.current
+        if layer is not None:
+            st = self._entry(layer, phase)
+
+            def call(*args):
+                outer = current[0]
+                current[0] = layer
+                stack.append(0)
+                t = clock()
+                try:
+                    return fn(*args)
+                finally:
+                    dt = clock() - t
+                    nested = stack.pop()
+                    stack[-1] += dt
+                    current[0] = outer
+                    st[0] += 1; st[1] += dt; st[2] += dt - nested
+            return call
+
+        # a phase belongs to the layer it is called from
+        by_layer, entry = {}, self._entry
+
+        def call(*args):
+            stack.append(0)
+            t = clock()
+            try:
+                return fn(*args)
+            finally:
+                dt = clock() - t
+                nested = stack.pop()
+                stack[-1] += dt
+                st = by_layer.get(current[0])
+                if st is None:
+                    st = by_layer[current[0]] = entry(current[0], phase)
+                st[0] += 1; st[1] += dt; st[2] += dt - nested
+        return call
+
+    def _patch(self, obj, name, wrapped):
+        # module globals are replaced in place, methods are shadowed by an
+        # instance attribute; uninstall() undoes both
+        ns = obj if isinstance(obj, dict) else vars(obj)
+        self._patched.append((ns, name, ns.get(name, _MISSING)))
+        ns[name] = wrapped
+
+    def instrument(self, proc):
+        """Wrap every layer reachable through .wrap, the core's sink, and the
+        phase helpers in each layer's module. Returns proc."""
+        layer, modules = proc, []
+        while layer is not None:
+            name = type(layer).__name__
+            self.seen[name] += 1
+            if self.seen[name] > 1:
+                name = f"{name}#{self.seen[name]}"
+            self.order.append(name)
+            for m in LAYER_METHODS:
+                if hasattr(layer, m):
+                    self._patch(layer, m, self._frame(getattr(layer, m), name))
+            mod = vars(sys.modules[type(layer).__module__])
+            if mod not in modules:
+                modules.append(mod)
+            sink = getattr(layer, "sink", None)
+            if sink is not None:
+                # encode runs inside write_*, so its time lands in serialize
+                self._patch(sink, "encode", self._frame(sink.encode, phase="serialize"))
+                for m in SINK_METHODS:
+                    self._patch(sink, m, self._frame(getattr(sink, m), phase="write"))
+            layer = getattr(layer, "wrap", None)
+        for mod in modules:
+            for fn, phase in PHASES.items():
+                if fn in mod:
+                    self._patch(mod, fn, self._frame(mod[fn], phase=phase))
+        return proc
+
+    def uninstall(self):
+        for ns, name, fn in reversed(self._patched):
+            if fn is _MISSING:
+                del ns[name]
+            else:
+                ns[name] = fn
+        self._patched = []
+
+    def frame_ns(self, depth=None, n=20000, repeat=5):
+        """Measured cost of a (layer frame, phase frame), to judge the
+        profile's overhead. Each kind is timed the way a chain runs it: a
+        stack of `depth` nested frames called with an argument, against the
+        same stack unwrapped. Frames get dearer the deeper they nest, so
+        depth defaults to two per instrumented layer (a layer and a phase)."""
+        depth = depth or max(2, 2 * (len(self.order) - 1))
+        saved, self.stats = self.stats, {}
+        clock = self.clock
+
+        def stack(wrap):
+            f = lambda t: t
+            for i in range(depth):
+                f = wrap((lambda inner: lambda t: inner(t))(f), i)
+            return f
+
+        def per_call(f):
+            # median of repeat runs of n calls, in ns per call
+            runs = []
+            for _ in range(repeat):
+                t = clock()
+                for _ in range(n):
+                    f(None)
+                runs.append((clock() - t) / n)
+            return sorted(runs)[repeat // 2]
+
+        bare = per_call(stack(lambda f, i: f))
+        layer_ns = (per_call(stack(lambda f, i: self._frame(f, f"(calibrate)#{i}"))) - bare) / depth
+        # phase frames charge the layer around them, as in a chain
+        phases = stack(lambda f, i: self._frame(f, phase=f"calibrate{i}"))
+        phase_ns = (per_call(self._frame(phases, "(calibrate)")) - bare) / depth - layer_ns / depth
+        self.stats = saved
+        self.stack[-1] = 0
+        return max(layer_ns, 0.0), max(phase_ns, 0.0)
+
+
+def merge_stats(results):
+    # add up the "layers" stats of all worker results, or None without --layers
+    parts = [r["layers"] for r in results if "layers" in r]
+    if not parts:
+        return None
+    stats, order = {}, []
+    for p in parts:
+        for layer in p["order"]:
+            if layer not in order:
+                order.append(layer)
+        for key, (calls, inc, own) in p["stats"].items():
+            st = stats.setdefault(key, [0, 0, 0])
+            st[0] += calls; st[1] += inc; st[2] += own
+    return {"order": order, "stats": stats,
+            "frame_ns": tuple(map(max, zip(*(p["frame_ns"] for p in parts))))}
+
+
+def report(layers, elapsed_ms, energy_j=0.0):
+    """Breakdown per layer: calls, inclusive and exclusive ms, exclusive ms
+    per phase ("other" is the layer's own code) and, given energy_j, the
+    layer's share of it by exclusive time."""
+    stats = layers["stats"]
+    total = sum(st[2] for st in stats.values())
+    layer_ns, phase_ns = layers["frame_ns"]
+    overhead_ns = sum(st[0] * (phase_ns if ph else layer_ns) for (_, ph), st in stats.items())
+    out = []
+    for layer in layers["order"]:
+        own = stats.get((layer, None), [0, 0, 0])
+        phases = {ph: st[2] / 1e6 for (l, ph), st in stats.items() if l == layer and ph}
+        if not own[0] and not phases:
+            continue
+        exclusive_ns = own[2] + sum(st[2] for (l, ph), st in stats.items() if l == layer and ph)
+        row = {
+            "layer": layer,
+            "calls": own[0],
+            "inclusive_ms": (own[1] if own[0] else exclusive_ns) / 1e6,
+            "exclusive_ms": exclusive_ns / 1e6,
+            "phases_ms": dict(phases, other=own[2] / 1e6),
+        }
+        if energy_j and total:
+            row["energy_j"] = energy_j * exclusive_ns / total
+        out.append(row)
+    return {
+        "elapsed_ms": elapsed_ms,
+        "attributed_ms": total / 1e6,
+        "overhead_ms_est": overhead_ns / 1e6,
+        "layers": out,
+    }
+
+
+def format_report(rep):
+    lines = [f"{'layer':<22}{'calls':>9}{'incl ms':>11}{'excl ms':>11}  phases (exclusive ms)"]
+    for row in rep["layers"]:
+        phases = "  ".join(f"{k}={v:.1f}" for k, v in row["phases_ms"].items() if v)
+        lines.append(f"{row['layer']:<22}{row['calls']:>9}{row['inclusive_ms']:>11.1f}"
+                     f"{row['exclusive_ms']:>11.1f}  {phases}")
+    lines.append(f"attributed {rep['attributed_ms']:.1f} of {rep['elapsed_ms']:.1f} ms, "
+                 f"of which ~{rep['overhead_ms_est']:.1f} ms is profiling overhead")
+    return "\n".join(lines)
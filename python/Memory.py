@@ -0,0 +1,165 @@
+# Memory profile of the timed loop for the pattern runners (--memory).
+#
+#   peak RSS          high-water mark of the process (getrusage, or psutil's
+#                     peak working set on Windows)
+#   traced peak       tracemalloc high-water mark above what was live at start()
+#   bytes per msg     per handle()/publish()/process() call, how far traced
+#                     memory rose above its level when the call began, summed
+#                     and divided by the messages handled
+#   retained per msg  traced memory still live at stop(), per message
+#   GC                collections and pause time per generation
+#
+# CPython keeps no running count of allocations, so churn is measured by the
+# per-call high-water mark: every object a call builds and drops again (a
+# parsed dict, its floats, the re-serialized string of each decorator layer)
+# shows up as long as it is live at the same time as the others.
+#
+# tracemalloc slows the loop down several times, so times from a --memory run
+# are not comparable with plain runs. --memory=gc keeps only peak RSS and the
+# GC counters, which cost next to nothing.
+
+import gc, sys, time, tracemalloc
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+GENERATIONS = 3
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    return None
+
+
+class MemoryMeter:
+    """start()/stop() around the timed loop, like Energy.EnergyMeter."""
+
+    def __init__(self, trace=True):
+        self.trace = trace
+        self.messages = 0
+        self.calls = 0
+        self.call_bytes = 0          # summed per-call rises, see traced()
+        self.peak = 0                # highest traced memory seen by traced()
+        self.traced_peak = None      # bytes above the level at start()
+        self.retained = None
+        self.peak_rss = None
+        self.gc_count = [0] * GENERATIONS
+        self.gc_pause = [0.0] * GENERATIONS   # seconds
+        self.gc_pause_max = 0.0
+        self._gc_start = None
+        self._base = 0
+        self._own_trace = False
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            pause = time.perf_counter() - self._gc_start
+            g = info["generation"]
+            self.gc_count[g] += 1
+            self.gc_pause[g] += pause
+            if pause > self.gc_pause_max:
+                self.gc_pause_max = pause
+            self._gc_start = None
+
+    def start(self):
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_trace = True
+            tracemalloc.reset_peak()
+            self._base = self.peak = tracemalloc.get_traced_memory()[0]
+        gc.callbacks.append(self._on_gc)
+
+    def stop(self, messages):
+        gc.callbacks.remove(self._on_gc)
+        self.messages = messages
+        if self.trace:
+            current, peak = tracemalloc.get_traced_memory()
+            self.traced_peak = max(peak, self.peak) - self._base
+            self.retained = current - self._base
+            if self._own_trace:
+                tracemalloc.stop()
+                self._own_trace = False
+        self.peak_rss = peak_rss()
+
+    def merge(self, other):
+        # shards run in separate processes: peaks are per process, the rest adds up
+        self.messages += other.messages
+        self.calls += other.calls
+        self.call_bytes += other.call_bytes
+        for name in ("traced_peak", "peak_rss"):
+            a, b = getattr(self, name), getattr(other, name)
+            setattr(self, name, b if a is None else a if b is None else max(a, b))
+        if other.retained is not None:
+            self.retained = (self.retained or 0) + other.retained
+        for g in range(GENERATIONS):
+            self.gc_count[g] += other.gc_count[g]
+            self.gc_pause[g] += other.gc_pause[g]
+        self.gc_pause_max = max(self.gc_pause_max, other.gc_pause_max)
+
+    def summary(self):
+        n = self.messages or None
+        mb = lambda b: None if b is None else b / 2**20
+        return {
+            "peak_rss_mb": mb(self.peak_rss),
+            "traced_peak_mb": mb(self.traced_peak),
+            "bytes_per_msg": self.call_bytes / n if n and self.calls else None,
+            "retained_per_msg": self.retained / n if n and self.retained is not None else None,
+            "gc_collections": list(self.gc_count),
+            "gc_pause_ms": [p * 1000 for p in self.gc_pause],
+            "gc_pause_max_ms": self.gc_pause_max * 1000,
+        }
+
+    def row(self):
+        """summary() as benchmark_results columns."""
+        s = self.summary()
+        row = {"mem_peak_rss_mb": s["peak_rss_mb"], "mem_traced_peak_mb": s["traced_peak_mb"],
+               "mem_bytes_per_msg": s["bytes_per_msg"], "mem_retained_per_msg": s["retained_per_msg"]}
+        for g in range(GENERATIONS):
+            row[f"gc_collections_gen{g}"] = s["gc_collections"][g]
+            row[f"gc_pause_gen{g}_ms"] = s["gc_pause_ms"][g]
+        row["gc_pause_max_ms"] = s["gc_pause_max_ms"]
+        return row
+
+
+def traced(fn, mem):
+    """Wrap a one-argument call (handle, publish, process) like
+    Latency.timed: each call adds how far traced memory rose during it to
+    mem. A no-op wrapper is not added when mem does not trace."""
+    if not mem.trace:
+        return fn
+    get, reset = tracemalloc.get_traced_memory, tracemalloc.reset_peak
+
+    def call(arg):
+        before = get()[0]
+        reset()
+        out = fn(arg)
+        peak = get()[1]
+        mem.calls += 1
+        mem.call_bytes += peak - before
+        if peak > mem.peak:
+            mem.peak = peak
+        return out
+    return call
+
+
+def merge_meters(results):
+    # one meter over all workers' results, or None without --memory
+    meters = [r["memory"] for r in results if "memory" in r]
+    if not meters:
+        return None
+    for other in meters[1:]:
+        meters[0].merge(other)
+    return meters[0]
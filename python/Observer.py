@@ -1,92 +1,561 @@
 # Run: python observer.py [messages] [metrics] [sink]
+#   [--observers=N] [--fanout=legacy|shared] [--threshold=F] [--batch=N]
+#   [--codec=NAME] [--format=json|binary] [--gen=message|bulk] [--corpus=PATH]
+#   [--input=SPEC] [--workers=N [--merge]] [--buffered] [--flush-records=N]
+#   [--flush-bytes=N] [--flush-ms=N] [--sink-thread] [--latency] [--memory[=gc]]
+#   [--energy=auto|rapl|fake|none] [--record=dict|telemetry] [--no-save]
+#   [--db=PATH] [--async [--queue=N] [--policy=block|drop_newest|drop_oldest]]
+#   [--cores=LIST]
 
-import sys, time, os, json, sqlite3
+import sys, time, os, json, asyncio, queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
-from Common import gen_message, parse, transform_compute_avg, serialize
+from types import MappingProxyType
+from Common import (parse, transform_compute_avg, serialize, cli_args, wall_ts, Telemetry,
+                    set_codec, set_record, save_result, make_generator,
+                    gen_batch, parse_batch, transform_compute_avg_batch, threshold_mask)
+from Corpus import Corpus
+from Input import Input
+from Workers import run_sharded, pin_cores
+from Sink import open_sink, sink_policy
+from Energy import EnergyMeter, energy_source
+from Latency import LatencyRecorder, timed, merged
+from Memory import MemoryMeter, traced, merge_meters
+
+
+def _frozen(m):
+    # read-only metrics for SharedMessage.record: a list becomes a tuple,
+    # buffers (binary format, Telemetry arrays) a read-only view without a copy
+    if m is None or type(m) is tuple:
+        return m
+    return tuple(m) if type(m) is list else memoryview(m).toreadonly()
+
+
+class SharedMessage:
+    """A published message shared by every subscriber in shared fan-out.
+
+    The record, its avg and its serialized form are computed once, on first
+    use, and reused by all observers. `record` is read-only all the way down:
+    the mapping is a proxy and its metrics a tuple or read-only memoryview.
+    Observers that need to modify it take their own `copy()`.
+    """
+    __slots__ = ("json_s", "_t", "_view", "_avg", "_out")
+
+    def __init__(self, json_s):
+        self.json_s = json_s
+        self._t = None
+        self._view = None
+        self._avg = None
+        self._out = None
+
+    def _decoded(self):
+        if self._t is None:
+            self._t = parse(self.json_s)
+        return self._t
+
+    @property
+    def record(self):
+        if self._view is None:
+            t = self._decoded()
+            t["metrics"] = _frozen(t.get("metrics"))
+            self._view = MappingProxyType(t)
+        return self._view
+
+    @property
+    def avg(self):
+        if self._avg is None:
+            self._avg = transform_compute_avg(self._decoded())
+        return self._avg
+
+    def encoded(self):
+        if self._out is None:
+            self.avg
+            self._out = serialize(self._t)
+        return self._out
+
+    def copy(self):
+        if type(self._decoded()) is Telemetry:
+            return self._t.copy()
+        t = dict(self._decoded())
+        t["metrics"] = list(t.get("metrics", []))
+        return t
 
 
 class TelemetrySubject:
-    def __init__(self):
+    def __init__(self, shared=False):
         self.subs = []
+        self.shared = shared
 
     def register(self, o):
         self.subs.append(o)
 
     def publish(self, json_s):
+        if self.shared:
+            msg = SharedMessage(json_s)
+            for o in self.subs:
+                o.on_shared(msg)
+        else:
+            for o in self.subs:
+                o.on_message(json_s)
+
+    def publish_batch(self, json_list):
+        # decoded once; observers share the batch and its avg column
+        b = parse_batch(json_list)
         for o in self.subs:
-            o.on_message(json_s)
+            o.on_batch(b)
+
+
+_STOP = object()
+
+
+class Subscription:
+    """One observer of an AsyncTelemetrySubject: its bounded queue, the
+    consumer draining it, and the counters behind stats().
+
+    Observers with their own on_message_async are drained by a task on the
+    event loop, from an asyncio.Queue. Plain (synchronous) observers get a
+    thread of their own that takes messages straight off a queue.Queue, so
+    a blocking sink neither stalls the loop nor waits on it. Either way at
+    most maxsize messages are queued, plus the one the observer is handling.
+    A full queue only counts as the subscriber falling behind once its
+    thread has had a turn: the publisher gives up the GIL before it drops
+    or blocks.
+    """
+
+    def __init__(self, observer, maxsize, policy):
+        if policy not in AsyncTelemetrySubject.POLICIES:
+            raise ValueError(f"unknown policy {policy!r}")
+        self.observer = observer
+        self.threaded = type(observer).on_message_async is Observer.on_message_async
+        self.queue = queue.Queue(maxsize) if self.threaded else asyncio.Queue(maxsize)
+        self.policy = policy
+        self.task = None
+        self._pool = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    def start(self):
+        # call from inside the running event loop
+        if self.threaded:
+            # one thread drains the queue, the other waits on puts (block, close)
+            self._pool = ThreadPoolExecutor(2, thread_name_prefix="observer")
+            self.task = asyncio.get_running_loop().run_in_executor(self._pool, self._drain)
+        else:
+            self.task = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        # returns once everything already queued has been handled
+        if self.threaded:
+            await asyncio.get_running_loop().run_in_executor(self._pool, self.queue.put, _STOP)
+            await self.task
+            self._pool.shutdown()
+        else:
+            await self.queue.put(_STOP)
+            await self.task
+
+    async def offer(self, json_s):
+        q = self.queue
+        self.published += 1
+        item = (time.perf_counter(), json_s)
+        if self.threaded and q.full():
+            time.sleep(0)   # let the subscriber's thread catch up first
+        if q.full():
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return
+            if self.policy == "drop_oldest":
+                try:
+                    q.get_nowait()
+                except (queue.Empty, asyncio.QueueEmpty):
+                    pass    # the subscriber's thread made room meanwhile
+                else:
+                    if not self.threaded:
+                        q.task_done()
+                    self.dropped += 1
+        if self.policy != "block":
+            q.put_nowait(item)
+        elif not self.threaded:
+            await q.put(item)   # backpressure
+        elif q.full():
+            await asyncio.get_running_loop().run_in_executor(self._pool, q.put, item)
+        else:
+            q.put_nowait(item)
+        if q.qsize() > self.max_depth:
+            self.max_depth = q.qsize()
+
+    def _done(self, queued):
+        wait = time.perf_counter() - queued
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+        self.delivered += 1
+
+    def _drain(self):
+        # the subscription's thread, for synchronous observers
+        q, o = self.queue, self.observer
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            queued, json_s = item
+            if type(json_s) is Telemetry:
+                # decoded once by the publisher (run_async with --record=telemetry)
+                o.on_record(json_s)
+            else:
+                o.on_message(json_s)
+            self._done(queued)
+
+    async def _consume(self):
+        q = self.queue
+        o = self.observer
+        while True:
+            item = await q.get()
+            q.task_done()
+            if item is _STOP:
+                break
+            queued, json_s = item
+            await o.on_message_async(serialize(json_s) if type(json_s) is Telemetry else json_s)
+            self._done(queued)
+
+    @property
+    def lag(self):
+        # published but not handled (yet); dropped messages are not lag
+        return self.published - self.delivered - self.dropped
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "lag": self.lag,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "mean_wait_ms": self.total_wait / self.delivered * 1000 if self.delivered else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+class AsyncTelemetrySubject:
+    """Subject where every observer has its own bounded queue and consumer
+    (a task on the loop, or a thread for synchronous observers; see
+    Subscription), so a slow subscriber only delays itself.
+
+    What publish does when a subscriber's queue is full:
+      "block"        wait for room, slowing the publisher down (backpressure)
+      "drop_newest"  drop the new message for that subscriber
+      "drop_oldest"  drop the oldest queued message to make room
+    """
+    POLICIES = ("block", "drop_newest", "drop_oldest")
+
+    def __init__(self, maxsize=1024, policy="block"):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.subs = []
 
+    def register(self, o, maxsize=None, policy=None):
+        sub = Subscription(o, maxsize or self.maxsize, policy or self.policy)
+        self.subs.append(sub)
+        return sub
 
-class ProcessorObserver:
+    def start(self):
+        # call from inside the running event loop
+        for sub in self.subs:
+            sub.start()
+
+    async def publish(self, json_s):
+        for sub in self.subs:
+            await sub.offer(json_s)
+        await asyncio.sleep(0)   # give the consumers a turn
+
+    async def close(self):
+        # stop after everything already queued has been handled
+        await asyncio.gather(*(sub.stop() for sub in self.subs))
+
+    def stats(self):
+        return [sub.stats() for sub in self.subs]
+
+
+class Observer:
+    def on_message(self, json_s):
+        raise NotImplementedError
+
+    async def on_message_async(self, json_s):
+        # override for sinks that do real async I/O (sockets, aiofiles, ...)
+        self.on_message(json_s)
+
+    def on_shared(self, msg):
+        # observers without a shared-aware path still get the raw string
+        self.on_message(msg.json_s)
+
+    def on_record(self, t):
+        # t is a Common.Telemetry shared with the other subscribers; observers
+        # without a record path get it re-encoded
+        self.on_message(serialize(t))
+
+    def on_batch(self, b):
+        raise NotImplementedError
+
+
+class ProcessorObserver(Observer):
     def __init__(self, sink_file, threshold=0.5):
-        self.sink = open(sink_file, "a")
+        self.sink = open_sink(sink_file)
         self.threshold = threshold
 
     def on_message(self, json_s):
         t = parse(json_s)
         transform_compute_avg(t)
         if t["avg"] >= self.threshold:
-            self.sink.write(serialize(t) + "\n")
+            self.sink.write_record(t)
+
+    def on_shared(self, msg):
+        if msg.avg >= self.threshold:
+            self.sink.write_encoded(msg.encoded())
+
+    def on_record(self, t):
+        if t.avg is None:
+            transform_compute_avg(t)
+        if t.avg >= self.threshold:
+            self.sink.write_record(t)
+
+    def on_batch(self, b):
+        if b.avg is None:
+            transform_compute_avg_batch(b)
+        self.sink.write_batch(b.take(threshold_mask(b, self.threshold)))
 
     def close(self):
         self.sink.close()
 
 
-if __name__ == "__main__":
+def run(start, stop, sink, metrics, opts, meter=None):
+    """Process messages [start, stop) into sink; returns {"elapsed_ms": loop time, ...}.
+    meter, if given, is an Energy.EnergyMeter run around the timed loop."""
+    observers = int(opts.get("observers", 1))
+    fanout = opts.get("fanout", "legacy")   # "shared" = decode once for all observers
+    batch = int(opts.get("batch", 0))       # > 1 = vectorized batch path
+    set_codec(opts.get("codec", "json"))
+    set_record(opts.get("record", "dict"))
+    gen = make_generator(opts, stop)
+    if "corpus" in opts:
+        # replay a pre-generated corpus instead of generating in the timed loop
+        gen = Corpus(opts["corpus"]).gen
+    # --input: stream lines from a file or socket instead; [start, stop) is a cap
+    src = Input(opts["input"], stop - start) if "input" in opts else None
 
-    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
-    metrics = int(sys.argv[2]) if len(sys.argv) > 2 else 50
-    sink = sys.argv[3] if len(sys.argv) > 3 else os.devnull
+    threshold = float(opts.get("threshold", 0.5))
+    procs = [ProcessorObserver(open_sink(sink, sink_policy(opts)), threshold)
+             for _ in range(observers)]
+    lat = LatencyRecorder() if "latency" in opts else None
+    mem = MemoryMeter(trace=opts["memory"] != "gc") if "memory" in opts else None
+    if "async" in opts:
+        return run_async(start, stop, metrics, gen, procs, int(opts.get("queue", 1024)),
+                         opts.get("policy", "block"), meter, lat,
+                         decode=opts.get("record") == "telemetry", src=src, mem=mem)
 
-    subj = TelemetrySubject()
-    proc = ProcessorObserver(sink)
-    subj.register(proc)
+    subj = TelemetrySubject(shared=(fanout == "shared"))
+    for proc in procs:
+        subj.register(proc)
 
-    start = time.perf_counter()
+    publish, publish_batch = subj.publish, subj.publish_batch
+    if mem:
+        publish, publish_batch = traced(publish, mem), traced(publish_batch, mem)
+    if lat:
+        # per publish() call; in batch mode one sample is one batch
+        publish, publish_batch = timed(publish, lat), timed(publish_batch, lat)
 
-    for i in range(messages):
-        subj.publish(gen_message(metrics, i))
+    if mem: mem.start()
+    if meter: meter.start()
+    w0, t0 = time.time(), time.perf_counter()
 
-    end = time.perf_counter()
-    proc.close()
+    if src is not None:
+        if batch > 1:
+            for b in src.batches(batch):
+                publish_batch(b)
+        else:
+            for m in src:
+                publish(m)
+    elif batch > 1:
+        for s in range(start, stop, batch):
+            publish_batch(gen_batch(metrics, s, min(batch, stop - s), gen))
+    else:
+        for i in range(start, stop):
+            publish(gen(metrics, i))
 
-    elapsed_ms = (end - start) * 1000
+    t1, w1 = time.perf_counter(), time.time()
+    if meter: meter.stop()
+    if mem: mem.stop(src.count if src is not None else stop - start)
+    for proc in procs:
+        proc.close()
+    return {"elapsed_ms": (t1 - t0) * 1000, "window": (w0, w1),
+            **({"messages": src.count,
+                "metrics": metrics if src.metrics is None else src.metrics} if src is not None else {}),
+            **({"latency": lat} if lat else {}),
+            **({"memory": mem} if mem else {})}
+
+
+def run_async(start, stop, metrics, gen, procs, maxsize, policy, meter=None, lat=None,
+              decode=False, src=None, mem=None):
+    # decode=True parses each message once, before it is queued: the queues
+    # then hold compact Telemetry records that all subscribers share
+    subj = AsyncTelemetrySubject(maxsize, policy)
+    for proc in procs:
+        subj.register(proc)
+
+    async def main():
+        subj.start()
+        clock = time.perf_counter_ns
+        msgs = src if src is not None else (gen(metrics, i) for i in range(start, stop))
+        for m in msgs:
+            if decode:
+                m = parse(m)
+            if lat:
+                # time until publish returns, i.e. including backpressure waits
+                c = clock()
+                await subj.publish(m)
+                lat.record(clock() - c)
+            else:
+                await subj.publish(m)
+        await subj.close()
+
+    # no per-call bytes here: the traced peak covers what piles up in the queues
+    if mem: mem.start()
+    if meter: meter.start()
+    w0, t0 = time.time(), time.perf_counter()
+    asyncio.run(main())
+    t1, w1 = time.perf_counter(), time.time()
+    if meter: meter.stop()
+    if mem: mem.stop(src.count if src is not None else stop - start)
+    for proc in procs:
+        proc.close()
+    return {"elapsed_ms": (t1 - t0) * 1000, "window": (w0, w1), "subscribers": subj.stats(),
+            **({"messages": src.count,
+                "metrics": metrics if src.metrics is None else src.metrics} if src is not None else {}),
+            **({"latency": lat} if lat else {}),
+            **({"memory": mem} if mem else {})}
+
+
+if __name__ == "__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    # with --input, messages caps the lines read (0 or omitted = all of them)
+    messages = int(args[0]) if len(args) > 0 else (0 if "input" in opts else 100000)
+    # with --corpus or --input the data fixes the metrics count; a metrics
+    # argument that disagrees with it is an error
+    given = int(args[1]) if len(args) > 1 else None
+    metrics = 50 if given is None else given
+    sink = args[2] if len(args) > 2 else os.devnull
+    observers = int(opts.get("observers", 1))
+    fanout = opts.get("fanout", "legacy")
+    batch = int(opts.get("batch", 0))
+    workers = int(opts.get("workers", 1))
+    threshold = float(opts.get("threshold", 0.5))
+    opts["codec"] = codec = set_codec(opts.get("codec", "json"))
+    opts["record"] = record = set_record(opts.get("record", "dict"))
+    fmt = opts.get("format", "json")
+    if "corpus" in opts:
+        corpus = Corpus(opts["corpus"])
+        if len(corpus) < messages:
+            sys.exit(f"corpus has only {len(corpus)} messages")
+        if given not in (None, corpus.metrics):
+            sys.exit(f"corpus has {corpus.metrics} metrics per message, not {given}")
+        metrics = corpus.metrics
+        fmt = corpus.format
+
+    if "input" in opts and workers > 1:
+        sys.exit("--input is read by a single process; drop --workers")
+    if "cores" in opts:
+        # before the worker pool starts, so the workers inherit it
+        pin_cores(opts["cores"])
+    if "async" in opts and (batch > 1 or fanout != "legacy"):
+        # each queue holds single messages, and SharedMessage decodes lazily,
+        # which is not safe across the subscriber threads
+        sys.exit("--async publishes one message at a time; drop --batch and --fanout")
+
+    source = energy_source(opts.get("energy", "auto"))
+    meter = EnergyMeter(source) if source else None
+
+    if workers > 1:
+        # energy is package-wide, so it is metered once around all workers
+        if meter: meter.start()
+        elapsed_ms, results = run_sharded(partial(run, metrics=metrics, opts=opts),
+                                            messages, workers, sink, merge="merge" in opts)
+        if meter: meter.stop()
+    else:
+        results = [run(0, messages, sink, metrics, opts, meter)]
+        elapsed_ms = results[0]["elapsed_ms"]
+        messages = results[0].get("messages", messages)
+        metrics = results[0].get("metrics", metrics)
+        if given not in (None, metrics):
+            sys.exit(f"input has {metrics} metrics per message, not {given}")
+    if source:
+        source.close()
+    worker_ms = [r["elapsed_ms"] for r in results]
+    # wall-clock span of the timed loops, for joining with sensor logs
+    start_ts = wall_ts(min(r["window"][0] for r in results))
+    end_ts = wall_ts(max(r["window"][1] for r in results))
+    lat = merged(results)
+    lat_ms = lat.summary_ms() if lat else {}
+    mem = merge_meters(results)
 
     # -------- PRINT RESULT --------
     print(json.dumps({
         "pattern": "observer",
         "lang": "python",
         "messages": messages,
-        "elapsed_ms": elapsed_ms
+        "metrics": metrics,
+        "threshold": threshold,
+        "observers": observers,
+        "fanout": fanout,
+        "batch": batch,
+        "codec": codec,
+        "format": fmt,
+        "gen": opts.get("gen", "message"),
+        **({"input": opts["input"]} if "input" in opts else {}),
+        "record": record,
+        "workers": workers,
+        "elapsed_ms": elapsed_ms,
+        "msgs_per_s": messages / (elapsed_ms / 1000) if elapsed_ms else 0.0,
+        "worker_ms": worker_ms,
+        "energy_source": source.kind if source else "none",
+        "energy_j": meter.joules if meter else 0.0,
+        "average_power_w": meter.watts if meter else 0.0,
+        **({"latency_ms": lat_ms} if lat else {}),
+        **({"memory": mem.summary()} if mem else {}),
+        **({"policy": opts.get("policy", "block"),
+            "subscribers": [r["subscribers"] for r in results]} if "async" in opts else {})
     }))
 
     # -------- INSERT INTO SQLITE DATABASE --------
-    try:
-        conn = sqlite3.connect("../telemetry_results.db")
-        cursor = conn.cursor()
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        average_power = 0.0   # will update later from HWInfo
-        energy = 0.0          # will compute later
-
-        cursor.execute("""
-        INSERT INTO benchmark_results
-        (timestamp, pattern, language, messages,
-         execution_time_ms, average_power_w, energy_j)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            timestamp,
-            "observer",
-            "python",
-            messages,
-            elapsed_ms,
-            average_power,
-            energy
-        ))
-
-        conn.commit()
-        conn.close()
-
-    except Exception as e:
-        print("Database error:", e)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # 0.0 when no energy source is available (e.g. Windows: use HWInfo)
+    average_power = meter.watts if meter else 0.0
+    energy = meter.joules if meter else 0.0
+
+    save_result({
+        "timestamp": timestamp,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "pattern": "observer",
+        "language": "python",
+        "messages": messages,
+        "execution_time_ms": elapsed_ms,
+        "average_power_w": average_power,
+        "energy_j": energy,
+        "codec": codec,
+        "workers": workers,
+        "metrics": metrics,
+        "threshold": threshold,
+        "depth": observers,
+        "latency_p50_ms": lat_ms.get("p50"),
+        "latency_p90_ms": lat_ms.get("p90"),
+        "latency_p99_ms": lat_ms.get("p99"),
+        "latency_p999_ms": lat_ms.get("p99.9"),
+        "latency_max_ms": lat_ms.get("max"),
+        **(mem.row() if mem else {})
+    }, opts)
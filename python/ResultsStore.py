@@ -0,0 +1,150 @@
+# SQLite results store for the benchmark runners and drivers.
+#
+# The database is opened in WAL mode with a busy timeout, so parallel
+# workers and sweep points can insert concurrently: readers never block,
+# and a writer that finds the lock taken waits for it instead of failing
+# with "database is locked". Rows can be buffered and written in one
+# transaction (batch=N) for sweeps. The schema lives here and is brought up
+# to date on first use, so a store never inserts into an outdated table.
+#
+# Path: ResultsStore(path), else $TELEMETRY_DB, else telemetry_results.db in
+# the repository root.
+
+import os, socket, sqlite3, subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(HERE, "..", "telemetry_results.db")
+BUSY_TIMEOUT_S = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmark_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    pattern TEXT,
+    language TEXT,
+    messages INTEGER,
+    execution_time_ms REAL,
+    average_power_w REAL,
+    energy_j REAL
+)
+"""
+
+# Columns added after the first runs; added to older databases in place.
+COLUMNS = [
+    ("codec", "TEXT"),
+    ("workers", "INTEGER"),
+    ("latency_p50_ms", "REAL"),
+    ("latency_p90_ms", "REAL"),
+    ("latency_p99_ms", "REAL"),
+    ("latency_p999_ms", "REAL"),
+    ("latency_max_ms", "REAL"),
+    ("metrics", "INTEGER"),
+    ("threshold", "REAL"),
+    ("depth", "INTEGER"),
+    ("host", "TEXT"),
+    ("git_commit", "TEXT"),
+    ("start_ts", "TEXT"),
+    ("end_ts", "TEXT"),
+    ("mem_peak_rss_mb", "REAL"),
+    ("mem_traced_peak_mb", "REAL"),
+    ("mem_bytes_per_msg", "REAL"),
+    ("mem_retained_per_msg", "REAL"),
+    ("gc_collections_gen0", "INTEGER"),
+    ("gc_collections_gen1", "INTEGER"),
+    ("gc_collections_gen2", "INTEGER"),
+    ("gc_pause_gen0_ms", "REAL"),
+    ("gc_pause_gen1_ms", "REAL"),
+    ("gc_pause_gen2_ms", "REAL"),
+    ("gc_pause_max_ms", "REAL"),
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_results_pattern_lang_msgs "
+    "ON benchmark_results (pattern, language, messages)",
+]
+
+_commit = None
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git tree."""
+    global _commit
+    if _commit is None:
+        try:
+            _commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                     capture_output=True, text=True).stdout.strip()
+        except OSError:
+            _commit = ""
+    return _commit or None
+
+
+class ResultsStore:
+    def __init__(self, path=None, batch=1):
+        self.path = path or os.environ.get("TELEMETRY_DB") or DEFAULT_PATH
+        self.batch = batch
+        self.pending = []
+        self.conn = None
+        self.meta = {"host": socket.gethostname(), "git_commit": git_commit()}
+
+    def connect(self):
+        if self.conn is None:
+            # autocommit mode; transactions are opened explicitly below
+            self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+            self.conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_S * 1000}")
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.ensure_schema()
+        return self.conn
+
+    def ensure_schema(self):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(benchmark_results)")}
+            for name, kind in COLUMNS:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE benchmark_results ADD COLUMN {name} {kind}")
+            for ddl in INDEXES:
+                conn.execute(ddl)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def insert(self, row):
+        """Queue one row (keys are column names); written once `batch` rows
+        are queued. host and git_commit are filled in when missing."""
+        self.pending.append({**self.meta, **row})
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        conn = self.connect()
+        # BEGIN IMMEDIATE takes the write lock up front (waiting up to the
+        # busy timeout), so a batch is never half written
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in self.pending:
+                conn.execute("INSERT INTO benchmark_results (%s) VALUES (%s)"
+                             % (", ".join(row), ", ".join("?" * len(row))),
+                             tuple(row.values()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
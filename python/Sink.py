@@ -0,0 +1,199 @@
+# Sinks shared by the Strategy, Observer and Decorator processors.
+#
+# LineSink is the original behaviour: a text file and one write() per record.
+# BufferedSink encodes records straight into a bytearray and writes it out in
+# one syscall when the flush policy triggers (record count, byte size or
+# age). With background=True full buffers go to a writer thread instead,
+# which drains whatever has queued up with a single os.writev, and also
+# writes out a buffer left idle for max_delay. Without it, age is checked on
+# writes only, every CLOCK_EVERY records.
+
+import os, time, threading, queue, contextlib
+from Common import serialize, serialize_bytes, serialize_batch
+
+IOV_MAX = 1024
+CLOCK_EVERY = 64   # records between max_delay checks
+
+
+def _write_all(fd, data):
+    with memoryview(data) as mv:
+        while mv:
+            n = os.write(fd, mv)
+            mv = mv[n:]
+
+
+class LineSink:
+    def __init__(self, path):
+        self.f = open(path, "a")
+        self.encode = serialize
+
+    def write_record(self, t):
+        self.f.write(self.encode(t) + "\n")
+
+    def write_encoded(self, s):
+        self.f.write(s + "\n")
+
+    def write_batch(self, b):
+        lines = serialize_batch(b, self.encode)
+        if lines:
+            self.f.write("\n".join(lines) + "\n")
+
+    def close(self):
+        self.f.close()
+
+
+class BufferedSink:
+    def __init__(self, path, max_records=4096, max_bytes=1 << 20, max_delay=1.0, background=False):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+        self.fd = os.open(path, flags, 0o644)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.encode = serialize_bytes
+        self.buf = bytearray()
+        self.count = 0
+        self.unclocked = 0   # records since the last max_delay check
+        self.last = time.monotonic()
+        self.flushes = 0
+        self.thread = None
+        self.error = None    # raised by flush()/close() once the writer thread failed
+        # the writer thread also flushes a buffer that sat idle for max_delay,
+        # so appends and flushes take the lock in background mode
+        self.lock = contextlib.nullcontext()
+        if background:
+            self.lock = threading.Lock()
+            self.pending = queue.Queue(maxsize=8)   # bounds memory if the disk falls behind
+            self.thread = threading.Thread(target=self._writer, daemon=True)
+            self.thread.start()
+
+    def _added(self, n=1):
+        self.count += n
+        self.unclocked += n
+        if self.count >= self.max_records or len(self.buf) >= self.max_bytes:
+            self.flush()
+        elif self.max_delay and self.unclocked >= CLOCK_EVERY:
+            self.unclocked = 0
+            if time.monotonic() - self.last >= self.max_delay:
+                self.flush()
+
+    def write_record(self, t):
+        data = self.encode(t)
+        with self.lock:
+            buf = self.buf
+            buf += data
+            buf += b"\n"
+            self._added()
+
+    def write_encoded(self, s):
+        with self.lock:
+            buf = self.buf
+            buf += s.encode() if type(s) is str else s
+            buf += b"\n"
+            self._added()
+
+    def write_batch(self, b):
+        recs = serialize_batch(b, self.encode)
+        with self.lock:
+            buf = self.buf
+            for rec in recs:
+                buf += rec
+                buf += b"\n"
+            self._added(len(b))
+
+    def flush(self):
+        if self.buf:
+            if self.thread is not None:
+                if self.error is not None:
+                    raise self.error
+                self.pending.put(self.buf)
+                self.buf = bytearray()
+            else:
+                _write_all(self.fd, self.buf)
+                self.buf.clear()
+            self.flushes += 1
+        self.count = self.unclocked = 0
+        self.last = time.monotonic()
+
+    def _take_idle(self):
+        # writer thread: the buffer if it has waited max_delay; skipped while
+        # the producer holds the lock, since it is not idle then
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            if not self.buf or time.monotonic() - self.last < self.max_delay:
+                return None
+            buf, self.buf = self.buf, bytearray()
+            self.count = self.unclocked = 0
+            self.last = time.monotonic()
+            self.flushes += 1
+            return buf
+        finally:
+            self.lock.release()
+
+    def _writer(self):
+        try:
+            while True:
+                try:
+                    bufs = [self.pending.get(timeout=self.max_delay or None)]
+                except queue.Empty:
+                    buf = self._take_idle()
+                    if buf:
+                        _write_all(self.fd, buf)
+                    continue
+                while len(bufs) < IOV_MAX:
+                    try:
+                        bufs.append(self.pending.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = bufs[-1] is None
+                if stop:
+                    bufs.pop()
+                if bufs:
+                    if hasattr(os, "writev"):
+                        n = os.writev(self.fd, bufs)
+                        total = sum(map(len, bufs))
+                        if n < total:
+                            _write_all(self.fd, b"".join(bufs)[n:])
+                    else:
+                        for buf in bufs:
+                            _write_all(self.fd, buf)
+                if stop:
+                    return
+        except Exception as e:
+            # keep taking buffers so flush() and close() never block on a
+            # dead writer; they raise the error instead
+            self.error = e
+            while self.pending.get() is not None:
+                pass
+
+    def close(self):
+        try:
+            with self.lock:
+                self.flush()
+        finally:
+            if self.thread is not None:
+                self.pending.put(None)
+                self.thread.join()
+            os.close(self.fd)
+        if self.error is not None:
+            raise self.error
+
+
+def sink_policy(opts):
+    """Buffered-sink settings from runner options, or None for LineSink."""
+    keys = ("buffered", "flush_records", "flush_bytes", "flush_ms", "sink_thread")
+    if not any(k in opts for k in keys):
+        return None
+    return {
+        "max_records": int(opts.get("flush_records", 4096)),
+        "max_bytes": int(opts.get("flush_bytes", 1 << 20)),
+        "max_delay": float(opts.get("flush_ms", 1000)) / 1000,
+        "background": "sink_thread" in opts,
+    }
+
+
+def open_sink(sink, policy=None):
+    # processors accept a path or an already open sink
+    if hasattr(sink, "write_record"):
+        return sink
+    return BufferedSink(sink, **policy) if policy else LineSink(sink)
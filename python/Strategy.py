@@ -1,102 +1,334 @@
 # Run: python strategy.py [messages] [metrics] [sink]
+#   [--batch=N] [--codec=NAME] [--format=json|binary] [--gen=message|bulk]
+#   [--corpus=PATH] [--input=SPEC] [--workers=N [--merge]] [--buffered]
+#   [--flush-records=N] [--flush-bytes=N] [--flush-ms=N] [--sink-thread]
+#   [--fused] [--threshold=F] [--record=dict|telemetry]
+#   [--energy=auto|rapl|fake|none] [--latency] [--memory[=gc]] [--no-save]
+#   [--db=PATH] [--cores=LIST]
 
-import sys, time, json, os, sqlite3
+import sys, time, json, os
+from functools import partial
 from datetime import datetime
-from Common import gen_message, parse, transform_compute_avg, serialize
+from Common import (parse, transform_compute_avg, cli_args, wall_ts,
+                    set_codec, set_record, save_result, make_generator,
+                    gen_batch, parse_batch, transform_compute_avg_batch, threshold_mask)
+from Corpus import Corpus
+from Input import Input
+from Workers import run_sharded, pin_cores
+from Sink import open_sink, sink_policy
+from Energy import EnergyMeter, energy_source
+from Latency import LatencyRecorder, timed, merged
+from Memory import MemoryMeter, traced, merge_meters
 
 
 class TransformStrategy:
+    # True if a fused kernel is registered for this strategy (see compile_strategies)
+    fusable = False
+
     def apply(self, t):
         raise NotImplementedError
 
+    def apply_batch(self, b):
+        raise NotImplementedError
+
 
 class AvgTransform(TransformStrategy):
+    fusable = True
+
     def apply(self, t):
         return transform_compute_avg(t)
 
+    def apply_batch(self, b):
+        return transform_compute_avg_batch(b)
+
 
 class FilterStrategy:
+    fusable = False
+
     def keep(self, t):
         raise NotImplementedError
 
+    # returns a boolean mask over the batch
+    def keep_batch(self, b):
+        raise NotImplementedError
+
 
 class ThresholdFilter(FilterStrategy):
+    fusable = True
+
     def __init__(self, threshold):
         self.threshold = threshold
 
     def keep(self, t):
         return t["avg"] >= self.threshold
 
+    def keep_batch(self, b):
+        return threshold_mask(b, self.threshold)
+
+
+# ---------------- FUSED KERNELS ----------------
+# (TransformStrategy class, FilterStrategy class) -> factory(transform, filter_)
+# returning (step, step_batch): step(t) transforms t and returns keep/drop in
+# one call, step_batch(b) returns the keep mask for a Batch.
+FUSED_KERNELS = {}
+
+
+def fused_kernel(transform_cls, filter_cls):
+    def register(factory):
+        FUSED_KERNELS[(transform_cls, filter_cls)] = factory
+        return factory
+    return register
+
+
+@fused_kernel(AvgTransform, ThresholdFilter)
+def _avg_threshold(transform, filter_):
+    threshold = filter_.threshold   # read once, not per message
+
+    def step(t):
+        arr = t.get("metrics", [])
+        avg = sum(arr) / len(arr) if arr else 0.0
+        t["avg"] = avg
+        return avg >= threshold
+
+    def step_batch(b):
+        return transform_compute_avg_batch(b) >= threshold
+
+    return step, step_batch
+
+
+def compile_strategies(transform, filter_):
+    """Turn a strategy pair into (step, step_batch). Fusable pairs with a
+    registered kernel get it; anything else is bound once into a closure,
+    which still saves the attribute lookups of the generic path."""
+    if transform.fusable and filter_.fusable:
+        factory = FUSED_KERNELS.get((type(transform), type(filter_)))
+        if factory is not None:
+            return factory(transform, filter_)
+    apply, keep = transform.apply, filter_.keep
+    apply_batch, keep_batch = transform.apply_batch, filter_.keep_batch
+
+    def step(t):
+        apply(t)
+        return keep(t)
+
+    def step_batch(b):
+        apply_batch(b)
+        return keep_batch(b)
+
+    return step, step_batch
+
 
 class Processor:
-    def __init__(self, transform, filter_, sink_file):
+    def __init__(self, transform, filter_, sink_file, fused=False):
         self.transform = transform
         self.filter = filter_
-        self.sink = open(sink_file, "a")
+        self.sink = open_sink(sink_file)
+        self.fused = fused
+        if fused:
+            self.compile()
 
     def handle(self, json_s):
         t = parse(json_s)
         self.transform.apply(t)
         if self.filter.keep(t):
-            self.sink.write(serialize(t) + "\n")
+            self.sink.write_record(t)
+
+    def handle_batch(self, json_list):
+        b = parse_batch(json_list)
+        self.transform.apply_batch(b)
+        self.sink.write_batch(b.take(self.filter.keep_batch(b)))
+
+    def compile(self):
+        # shadow handle/handle_batch with closures over the fused step
+        step, step_batch = compile_strategies(self.transform, self.filter)
+        write, write_batch = self.sink.write_record, self.sink.write_batch
+
+        def handle(json_s):
+            t = parse(json_s)
+            if step(t):
+                write(t)
+
+        def handle_batch(json_list):
+            b = parse_batch(json_list)
+            write_batch(b.take(step_batch(b)))
+
+        self.handle, self.handle_batch = handle, handle_batch
+        self.fused = True
+
+    def set_strategies(self, transform=None, filter_=None):
+        # switching at runtime recompiles a fused processor
+        if transform is not None:
+            self.transform = transform
+        if filter_ is not None:
+            self.filter = filter_
+        if self.fused:
+            self.compile()
 
     def close(self):
         self.sink.close()
 
 
-if __name__ == "__main__":
+def run(start, stop, sink, metrics, opts, meter=None):
+    """Process messages [start, stop) into sink; returns {"elapsed_ms": loop time, ...}.
+    meter, if given, is an Energy.EnergyMeter run around the timed loop."""
+    batch = int(opts.get("batch", 0))   # > 1 = vectorized batch path
+    set_codec(opts.get("codec", "json"))
+    set_record(opts.get("record", "dict"))
+    gen = make_generator(opts, stop)
+    if "corpus" in opts:
+        # replay a pre-generated corpus instead of generating in the timed loop
+        gen = Corpus(opts["corpus"]).gen
+    # --input: stream lines from a file or socket instead; [start, stop) is a cap
+    src = Input(opts["input"], stop - start) if "input" in opts else None
 
-    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
-    metrics = int(sys.argv[2]) if len(sys.argv) > 2 else 50
-    sink = sys.argv[3] if len(sys.argv) > 3 else os.devnull
+    p = Processor(AvgTransform(), ThresholdFilter(float(opts.get("threshold", 0.5))), open_sink(sink, sink_policy(opts)),
+                  fused="fused" in opts)
 
-    p = Processor(AvgTransform(), ThresholdFilter(0.5), sink)
+    handle, handle_batch = p.handle, p.handle_batch
+    mem = MemoryMeter(trace=opts["memory"] != "gc") if "memory" in opts else None
+    if mem:
+        handle, handle_batch = traced(handle, mem), traced(handle_batch, mem)
+    lat = LatencyRecorder() if "latency" in opts else None
+    if lat:
+        # per handle() call; in batch mode one sample is one batch
+        handle, handle_batch = timed(handle, lat), timed(handle_batch, lat)
 
-    start = time.perf_counter()
+    if mem: mem.start()
+    if meter: meter.start()
+    w0, t0 = time.time(), time.perf_counter()
 
-    for i in range(messages):
-        p.handle(gen_message(metrics, i))
+    if src is not None:
+        if batch > 1:
+            for b in src.batches(batch):
+                handle_batch(b)
+        else:
+            for m in src:
+                handle(m)
+    elif batch > 1:
+        for s in range(start, stop, batch):
+            handle_batch(gen_batch(metrics, s, min(batch, stop - s), gen))
+    else:
+        for i in range(start, stop):
+            handle(gen(metrics, i))
 
-    end = time.perf_counter()
+    t1, w1 = time.perf_counter(), time.time()
+    if meter: meter.stop()
+    if mem: mem.stop(src.count if src is not None else stop - start)
     p.close()
+    return {"elapsed_ms": (t1 - t0) * 1000, "window": (w0, w1),
+            **({"messages": src.count,
+                "metrics": metrics if src.metrics is None else src.metrics} if src is not None else {}),
+            **({"latency": lat} if lat else {}),
+            **({"memory": mem} if mem else {})}
 
-    elapsed_ms = (end - start) * 1000
+
+if __name__ == "__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    # with --input, messages caps the lines read (0 or omitted = all of them)
+    messages = int(args[0]) if len(args) > 0 else (0 if "input" in opts else 100000)
+    # with --corpus or --input the data fixes the metrics count; a metrics
+    # argument that disagrees with it is an error
+    given = int(args[1]) if len(args) > 1 else None
+    metrics = 50 if given is None else given
+    sink = args[2] if len(args) > 2 else os.devnull
+    batch = int(opts.get("batch", 0))
+    workers = int(opts.get("workers", 1))
+    threshold = float(opts.get("threshold", 0.5))
+    opts["codec"] = codec = set_codec(opts.get("codec", "json"))
+    opts["record"] = record = set_record(opts.get("record", "dict"))
+    fmt = opts.get("format", "json")
+    if "corpus" in opts:
+        corpus = Corpus(opts["corpus"])
+        if len(corpus) < messages:
+            sys.exit(f"corpus has only {len(corpus)} messages")
+        if given not in (None, corpus.metrics):
+            sys.exit(f"corpus has {corpus.metrics} metrics per message, not {given}")
+        metrics = corpus.metrics
+        fmt = corpus.format
+
+    if "input" in opts and workers > 1:
+        sys.exit("--input is read by a single process; drop --workers")
+    if "cores" in opts:
+        # before the worker pool starts, so the workers inherit it
+        pin_cores(opts["cores"])
+
+    source = energy_source(opts.get("energy", "auto"))
+    meter = EnergyMeter(source) if source else None
+
+    if workers > 1:
+        # energy is package-wide, so it is metered once around all workers
+        if meter: meter.start()
+        elapsed_ms, results = run_sharded(partial(run, metrics=metrics, opts=opts),
+                                            messages, workers, sink, merge="merge" in opts)
+        if meter: meter.stop()
+    else:
+        results = [run(0, messages, sink, metrics, opts, meter)]
+        elapsed_ms = results[0]["elapsed_ms"]
+        messages = results[0].get("messages", messages)
+        metrics = results[0].get("metrics", metrics)
+        if given not in (None, metrics):
+            sys.exit(f"input has {metrics} metrics per message, not {given}")
+    if source:
+        source.close()
+    worker_ms = [r["elapsed_ms"] for r in results]
+    # wall-clock span of the timed loops, for joining with sensor logs
+    start_ts = wall_ts(min(r["window"][0] for r in results))
+    end_ts = wall_ts(max(r["window"][1] for r in results))
+    lat = merged(results)
+    lat_ms = lat.summary_ms() if lat else {}
+    mem = merge_meters(results)
 
     # -------- PRINT RESULT --------
     print(json.dumps({
         "pattern": "strategy",
         "lang": "python",
         "messages": messages,
-        "elapsed_ms": elapsed_ms
+        "metrics": metrics,
+        "threshold": threshold,
+        "batch": batch,
+        "fused": "fused" in opts,
+        "codec": codec,
+        "format": fmt,
+        "gen": opts.get("gen", "message"),
+        **({"input": opts["input"]} if "input" in opts else {}),
+        "record": record,
+        "workers": workers,
+        "elapsed_ms": elapsed_ms,
+        "msgs_per_s": messages / (elapsed_ms / 1000) if elapsed_ms else 0.0,
+        "worker_ms": worker_ms,
+        "energy_source": source.kind if source else "none",
+        "energy_j": meter.joules if meter else 0.0,
+        "average_power_w": meter.watts if meter else 0.0,
+        **({"latency_ms": lat_ms} if lat else {}),
+        **({"memory": mem.summary()} if mem else {})
     }))
 
     # -------- INSERT INTO SQLITE DATABASE --------
-    try:
-        conn = sqlite3.connect("../telemetry_results.db")
-        cursor = conn.cursor()
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        average_power = 0.0   # will update later from HWInfo
-        energy = 0.0          # will compute later
-
-        cursor.execute("""
-        INSERT INTO benchmark_results
-        (timestamp, pattern, language, messages,
-         execution_time_ms, average_power_w, energy_j)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            timestamp,
-            "strategy",
-            "python",
-            messages,
-            elapsed_ms,
-            average_power,
-            energy
-        ))
-
-        conn.commit()
-        conn.close()
-
-    except Exception as e:
-        print("Database error:", e)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # 0.0 when no energy source is available (e.g. Windows: use HWInfo)
+    average_power = meter.watts if meter else 0.0
+    energy = meter.joules if meter else 0.0
+
+    save_result({
+        "timestamp": timestamp,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "pattern": "strategy",
+        "language": "python",
+        "messages": messages,
+        "execution_time_ms": elapsed_ms,
+        "average_power_w": average_power,
+        "energy_j": energy,
+        "codec": codec,
+        "workers": workers,
+        "metrics": metrics,
+        "threshold": threshold,
+        "latency_p50_ms": lat_ms.get("p50"),
+        "latency_p90_ms": lat_ms.get("p90"),
+        "latency_p99_ms": lat_ms.get("p99"),
+        "latency_p999_ms": lat_ms.get("p99.9"),
+        "latency_max_ms": lat_ms.get("max"),
+        **(mem.row() if mem else {})
+    }, opts)
@@ -0,0 +1,134 @@
+# Run: python Sweep.py [strategy|observer|decorator ...]
+#   [--messages=N,N,..] [--metrics=N,..] [--threshold=F,..] [--depth=N,..]
+#   [--workers=N,..] [--random=N [--seed=N]] [--jobs=N] [--cores=LIST]
+#   [--repeat=N] [--args="runner options"] [--db=PATH] [--db-batch=N] [--dry-run]
+#
+# Parameter sweep over message count x metrics per message x filter
+# threshold x chain depth x worker count. Every axis takes a comma list; the
+# design is their full grid, or --random=N points drawn from it. Depth is
+# --observers for the observer runner and --depth for the decorator one; the
+# strategy runner has no depth, so that axis collapses for it.
+#
+# Points run in parallel (--jobs), each runner pinning itself (--cores) to its
+# own `workers` cores taken from --cores (default: every core this process
+# may use except core 0, which is left to the OS and this driver). A point
+# waits until enough cores are free, so points never share a core. Runners
+# hand their result row back (--emit-row) and the sweep writes rows to the
+# results store in batches of --db-batch, instead of every point opening the
+# database on its own.
+
+import sys, os, json, random, shlex, itertools, subprocess, threading
+from concurrent.futures import ThreadPoolExecutor
+from Common import cli_args
+from ResultsStore import ResultsStore
+from Workers import parse_cores
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RUNNERS = {"strategy": "Strategy.py", "observer": "Observer.py", "decorator": "Decorator.py"}
+DEPTH_OPTION = {"observer": "--observers", "decorator": "--depth"}
+AXES = {   # name -> (parse, default values)
+    "messages": (int, [10000, 100000]),
+    "metrics": (int, [50]),
+    "threshold": (float, [0.5]),
+    "depth": (int, [1]),
+    "workers": (int, [1]),
+}
+
+
+def default_cores():
+    if not hasattr(os, "sched_getaffinity"):
+        return list(range(os.cpu_count() or 1))
+    cores = sorted(os.sched_getaffinity(0))
+    return cores[1:] if len(cores) > 1 and cores[0] == 0 else cores
+
+
+def design(runners, axes, n_random=None, seed=0):
+    """[(runner, point dict)]: full grid, or n_random points drawn from it."""
+    points = []
+    for runner in runners:
+        names = [a for a in axes if a != "depth" or runner in DEPTH_OPTION]
+        for values in itertools.product(*(axes[a] for a in names)):
+            points.append((runner, dict(zip(names, values))))
+    if n_random is not None and n_random < len(points):
+        points = random.Random(seed).sample(points, n_random)
+    return points
+
+
+def command(runner, point, extra, cores=None):
+    cmd = [sys.executable, RUNNERS[runner], str(point["messages"]), str(point["metrics"]),
+           f"--threshold={point['threshold']}", f"--workers={point['workers']}", "--emit-row"]
+    if "depth" in point:
+        cmd.append(f"{DEPTH_OPTION[runner]}={point['depth']}")
+    if cores:
+        # the runner pins itself; preexec_fn is not safe from the driver's threads
+        cmd.append("--cores=" + ",".join(map(str, cores)))
+    return cmd + extra
+
+
+class CorePool:
+    """Hands out disjoint sets of cores; acquire() blocks until n are free."""
+
+    def __init__(self, cores):
+        self.free = list(cores)
+        self.size = len(self.free)
+        self.cond = threading.Condition()
+
+    def acquire(self, n):
+        n = min(n, self.size)
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.free) >= n)
+            taken, self.free = self.free[:n], self.free[n:]
+            return taken
+
+    def release(self, cores):
+        with self.cond:
+            self.free.extend(cores)
+            self.cond.notify_all()
+
+
+def run_point(runner, point, extra, pool):
+    cores = pool.acquire(point["workers"])
+    try:
+        proc = subprocess.run(command(runner, point, extra, cores), cwd=HERE,
+                              capture_output=True, text=True)
+    finally:
+        pool.release(cores)
+    if proc.returncode:
+        return dict(point, pattern=runner, cores=cores, error=proc.stderr.strip()[-500:]), None
+    *_, result, row = proc.stdout.strip().splitlines()
+    return dict(json.loads(result), cores=cores), json.loads(row)["row"]
+
+
+if __name__ == "__main__":
+
+    args, opts = cli_args(sys.argv[1:])
+    runners = args or list(RUNNERS)
+    axes = {name: [cast(v) for v in str(opts[name]).split(",")] if name in opts else default
+            for name, (cast, default) in AXES.items()}
+    points = design(runners, axes, int(opts["random"]) if "random" in opts else None,
+                    int(opts.get("seed", 0)))
+    points = points * int(opts.get("repeat", 1))
+
+    extra = shlex.split(opts["args"]) if isinstance(opts.get("args"), str) else []
+    cores = parse_cores(opts["cores"]) if "cores" in opts else default_cores()
+    jobs = int(opts.get("jobs", max(1, len(cores) // max(axes["workers"]))))
+    if jobs > 1 and not any(a.startswith("--energy") for a in extra):
+        # RAPL is package-wide: concurrent points would be charged each
+        # other's energy, so parallel sweeps measure time only by default
+        extra.append("--energy=none")
+
+    if "dry_run" in opts:
+        for runner, point in points:
+            print(" ".join(command(runner, point, extra)))
+        sys.exit()
+
+    print(f"{len(points)} points, {jobs} in parallel on cores {cores}", file=sys.stderr)
+    pool = CorePool(cores)
+    with ThreadPoolExecutor(jobs) as ex, \
+            ResultsStore(opts.get("db"), int(opts.get("db_batch", 16))) as store:
+        futures = [ex.submit(run_point, runner, point, extra, pool) for runner, point in points]
+        for f in futures:
+            result, row = f.result()
+            print(json.dumps(result), flush=True)
+            if row:
+                store.insert(row)
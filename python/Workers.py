@@ -0,0 +1,73 @@
+# Sharded execution for the pattern runners (--workers=N).
+#
+# [0, messages) is split into one contiguous shard per worker. Every worker
+# builds its own pattern object graph and writes to its own sink shard
+# (SINK.k); with merge=True the shards are appended to SINK in index order
+# once all workers are done, so the output matches a single-process run.
+#
+# --cores=LIST pins the runner to those cores before the pool starts, so its
+# workers inherit the affinity (Sweep.py gives every point its own cores).
+
+import os, shutil, time
+from multiprocessing import Pool
+
+
+def parse_cores(spec):
+    # "2-5,8" -> [2, 3, 4, 5, 8]
+    cores = []
+    for part in str(spec).split(","):
+        a, _, b = part.partition("-")
+        cores.extend(range(int(a), int(b or a) + 1))
+    return cores
+
+
+def pin_cores(spec):
+    """Pin this process to the cores in spec; processes started later
+    inherit it. Returns the cores, or None where affinity is not supported."""
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    cores = parse_cores(spec)
+    os.sched_setaffinity(0, cores)
+    return cores
+
+
+def shards(messages, workers):
+    step, extra = divmod(messages, workers)
+    bounds, start = [], 0
+    for k in range(workers):
+        stop = start + step + (1 if k < extra else 0)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def shard_sink(sink, k):
+    return sink if sink == os.devnull else f"{sink}.{k}"
+
+
+def _run_shard(job):
+    run, start, stop, sink = job
+    return run(start, stop, sink)
+
+
+def run_sharded(run, messages, workers, sink, merge=False):
+    """Call run(start, stop, sink) for every shard in a pool of `workers`
+    processes. run must be picklable and return a dict with the shard's
+    "elapsed_ms". Returns (wall-clock ms over all shards, [result per worker])."""
+    jobs = [(run, a, b, shard_sink(sink, k)) for k, (a, b) in enumerate(shards(messages, workers))]
+    if merge and sink != os.devnull:
+        # sinks are opened in append mode; start from empty shards
+        for *_, part in jobs:
+            if os.path.exists(part):
+                os.remove(part)
+    with Pool(workers) as pool:
+        start = time.perf_counter()
+        results = pool.map(_run_shard, jobs, chunksize=1)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    if merge and sink != os.devnull:
+        with open(sink, "ab") as out:
+            for *_, part in jobs:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(part)
+    return elapsed_ms, results
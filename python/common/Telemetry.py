@@ -1,7 +1,147 @@
+import gc
 import time
+import threading
+from array import array
 import psutil
 
+try:
+    from Energy import EnergyMeter, energy_source
+except ImportError:   # Energy.py lives in python/; run from there to get energy
+    energy_source = None
+try:
+    from Memory import MemoryMeter, traced
+except ImportError:   # likewise Memory.py
+    MemoryMeter = None
+
+
+def _percentiles(values, ps=(50, 90, 99)):
+    if not values:
+        return {}
+    s = sorted(values)
+    out = {f"p{p}": s[min(len(s) - 1, int(len(s) * p / 100))] for p in ps}
+    out["max"] = s[-1]
+    return out
+
+
+class Sampler:
+    """
+    Background thread that samples the process every `interval` seconds.
+    Every sample and GC pause is timestamped with time.perf_counter(), the
+    same clock the workload is timed with, so the series can be lined up
+    with phases of the run. Columns are kept in arrays to stay compact.
+    """
+
+    def __init__(self, interval=0.01, energy=None):
+        self.interval = interval
+        self.proc = psutil.Process()
+        self.meter = EnergyMeter(energy) if energy else None
+        self.t = array("d")
+        self.cpu = array("d")            # system-wide CPU %
+        self.rss = array("q")            # bytes
+        self.ctx_vol = array("q")        # cumulative voluntary switches
+        self.ctx_invol = array("q")      # cumulative involuntary switches
+        self.energy = array("d")         # cumulative joules since start
+        self.freq = []                   # per-core MHz, one array per core
+        self.gc = []                     # (start, duration s, generation)
+        self.marks = []                  # (t, label)
+        self._gc_start = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            now = time.perf_counter()
+            self.gc.append((self._gc_start, now - self._gc_start, info["generation"]))
+            self._gc_start = None
+
+    def _take(self):
+        self.t.append(time.perf_counter())
+        self.cpu.append(psutil.cpu_percent(interval=None))
+        self.rss.append(self.proc.memory_info().rss)
+        ctx = self.proc.num_ctx_switches()
+        self.ctx_vol.append(ctx.voluntary)
+        self.ctx_invol.append(ctx.involuntary)
+        freqs = psutil.cpu_freq(percpu=True) or []
+        if not self.freq:
+            self.freq = [array("d") for _ in freqs]
+        for col, f in zip(self.freq, freqs):
+            col.append(f.current)
+        if self.meter:
+            self.energy.append(self.meter.read())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._take()
+
+    def mark(self, label):
+        self.marks.append((time.perf_counter(), label))
+
+    def start(self):
+        psutil.cpu_percent(interval=None)   # prime the CPU % baseline
+        gc.callbacks.append(self._on_gc)
+        if self.meter:
+            self.meter.start()
+        self._take()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._take()
+        if self.meter:
+            self.meter.stop()
+        gc.callbacks.remove(self._on_gc)
+
+    def _summary(self, lo, hi):
+        idx = [i for i, t in enumerate(self.t) if lo <= t <= hi]
+        pauses = [d * 1000 for s, d, _ in self.gc if lo <= s <= hi]
+        out = {
+            "samples": len(idx),
+            "cpu_percent": _percentiles([self.cpu[i] for i in idx]),
+            "rss_mb": _percentiles([self.rss[i] / 2**20 for i in idx]),
+            "freq_mhz": _percentiles([col[i] for col in self.freq for i in idx]),
+            "gc_pauses": len(pauses),
+            "gc_pause_ms": _percentiles(pauses),
+            "gc_pause_total_ms": sum(pauses),
+        }
+        if len(idx) > 1:
+            a, b = idx[0], idx[-1]
+            dt = self.t[b] - self.t[a]
+            out["ctx_switches_per_s"] = ((self.ctx_vol[b] - self.ctx_vol[a])
+                                         + (self.ctx_invol[b] - self.ctx_invol[a])) / dt if dt else 0.0
+            if self.energy:
+                out["energy_j"] = self.energy[b] - self.energy[a]
+                out["average_power_w"] = out["energy_j"] / dt if dt else 0.0
+        return out
+
+    def report(self, start, end):
+        # phases run from one mark to the next; before the first is "start"
+        bounds = [(start, "start")] + [(t, l) for t, l in self.marks if start <= t <= end]
+        phases = {}
+        for (lo, label), (hi, _) in zip(bounds, bounds[1:] + [(end, None)]):
+            phases[label] = self._summary(lo, hi)
+        return {
+            "summary": self._summary(start, end),
+            "phases": phases,
+            "series": {
+                "t": [t - start for t in self.t],
+                "cpu_percent": self.cpu.tolist(),
+                "rss": self.rss.tolist(),
+                "ctx_voluntary": self.ctx_vol.tolist(),
+                "ctx_involuntary": self.ctx_invol.tolist(),
+                "freq_mhz": [col.tolist() for col in self.freq],
+                "energy_j": self.energy.tolist(),
+            },
+            "gc": [(s - start, d * 1000, g) for s, d, g in self.gc],
+        }
+
+
 class Telemetry:
+    _active = None
+
     @staticmethod
     def measure(fn, *args, **kwargs):
         """
@@ -30,3 +170,57 @@ class Telemetry:
             "cpu_after_percent": cpu_after,
             "result": str(result)[:100]
         }
+
+    @staticmethod
+    def measure_memory(fn, *args, n_messages=1, **kwargs):
+        """
+        Like measure(), plus a "memory" entry (see Memory.py): peak RSS,
+        tracemalloc peak, bytes per message for the `n_messages` messages
+        fn handles, and GC collections and pauses per generation.
+        """
+        if MemoryMeter is None:
+            raise RuntimeError("measure_memory needs Memory.py; run from python/")
+        mem = MemoryMeter()
+        mem.start()
+        try:
+            out = Telemetry.measure(traced(lambda _: fn(*args, **kwargs), mem), None)
+        finally:
+            mem.stop(n_messages)
+        out["memory"] = mem.summary()
+        return out
+
+    @staticmethod
+    def profile(fn, *args, interval=0.01, energy="auto", **kwargs):
+        """
+        Like measure(), but a background Sampler records CPU %, per-core
+        frequency, RSS, context switches, energy and GC pauses every
+        `interval` seconds while fn runs. The workload can call
+        Telemetry.mark("steady") etc. to split the report into phases.
+        """
+        source = energy_source(energy) if energy_source else None
+        sampler = Telemetry._active = Sampler(interval, source)
+        sampler.start()
+
+        start_time = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            end_time = time.perf_counter()
+            sampler.stop()
+            Telemetry._active = None
+            if source:
+                source.close()
+
+        out = {
+            "time_ms": (end_time - start_time) * 1000,
+            "interval_s": interval,
+            "result": str(result)[:100]
+        }
+        out.update(sampler.report(start_time, end_time))
+        return out
+
+    @staticmethod
+    def mark(label):
+        """Start a new phase in the running profile(); no-op otherwise."""
+        if Telemetry._active is not None:
+            Telemetry._active.mark(label)
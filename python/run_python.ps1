@@ -1,47 +1,16 @@
 # ----------------------------------------
-# Run Python Patterns 
+# Run Python Patterns
 # ----------------------------------------
+#
+# Warm-up, repetitions and cool-down are handled by Bench.py (see its
+# header for the options); on Linux run it directly:
+#   python Bench.py strategy observer decorator --messages=100000
+#
+# Without temperature or RAPL sensors (Windows) Bench.py cannot tell when
+# the CPU is back at idle, so a fixed cool-down pause is given here.
 
-$patterns = @(
-    @{ name="Strategy";  cmd='python Strategy.py 100000' }
-    @{ name="Observer";  cmd='python Observer.py 100000' }
-    @{ name="Decorator"; cmd='python Decorator.py 100000' }
-)
+Write-Host "Starting PYTHON Patterns: Strategy, Observer, Decorator" -ForegroundColor Yellow
 
-$reps = 30
-
-foreach ($p in $patterns) {
-
-    Write-Host "==========================================" -ForegroundColor Yellow
-    Write-Host "Starting PYTHON Pattern: $($p.name)" -ForegroundColor Yellow
-    Write-Host "=========================================="
-
-    # ---------------------------
-    # Warm-up Runs (NOT saved)
-    # ---------------------------
-   
-
-
-    # ---------------------------
-    # Measured Runs
-    # ---------------------------
-    for ($i = 1; $i -le $reps; $i++) {
-
-        Write-Host "Run $i / $reps for $($p.name)" -ForegroundColor Cyan
-
-        # Execute pattern
-        # (Execution time automatically inserted into SQLite)
-        cmd /c $p.cmd
-
-        if ($i -lt $reps) {
-            Write-Host "Cooling down 30 seconds..." -ForegroundColor DarkYellow
-            Start-Sleep -Seconds 30
-        }
-    }
-
-    Write-Host "Completed 30 runs of $($p.name)"
-    Write-Host "Cooling down 3 minutes before next pattern..." -ForegroundColor Red
-    Start-Sleep -Seconds 180
-}
+cmd /c python Bench.py strategy observer decorator --messages=100000 --cooldown-s=30
 
 Write-Host "All Python patterns completed." -ForegroundColor Green
@@ -0,0 +1,148 @@
+import os
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+POWER_COLUMN = "CPU Package Power [W]"
+CACHE_DIR = ".cache"           # created next to the CSV files
+CHUNK_ROWS = 100_000
+TIME_FORMAT = "%d.%m.%Y %H:%M:%S.%f"
+
+# HWiNFO writes "12,5" on comma-locale machines and sometimes keeps the
+# unit ("12.5 W"); both are stripped before the numeric conversion
+UNIT_SUFFIX = r"\s*[A-Za-z°%/]+$"
+
+
+# ==============================
+# 1. STREAMING CSV READER
+# ==============================
+
+def _to_float(s):
+    # vectorized over a whole chunk column
+    s = s.str.strip().str.replace(",", ".", regex=False).str.replace(UNIT_SUFFIX, "", regex=True)
+    return pd.to_numeric(s, errors="coerce").to_numpy(np.float64)
+
+
+def _parse(path, columns, chunk_rows):
+    """Read Date, Time and `columns` only, CHUNK_ROWS lines at a time, so
+    memory stays flat no matter how large the log is."""
+    wanted = {"Date", "Time", *columns}
+    times, values = [], {c: [] for c in columns}
+
+    reader = pd.read_csv(path, encoding="latin1", dtype=str, chunksize=chunk_rows,
+                         usecols=lambda c: c.strip() in wanted)
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        missing = [c for c in columns if c not in chunk.columns]
+        if missing:
+            raise KeyError(f"{path}: no column {missing[0]!r}")
+        t = pd.to_datetime(chunk["Date"] + " " + chunk["Time"], format=TIME_FORMAT,
+                           errors="coerce").to_numpy("datetime64[ns]")
+        cols = {c: _to_float(chunk[c]) for c in columns}
+        # the trailing header/footer rows HWiNFO appends have no valid time
+        ok = ~np.isnat(t)
+        times.append(t[ok])
+        for c in columns:
+            values[c].append(cols[c][ok])
+
+    out = {"time": np.concatenate(times) if times else np.array([], "datetime64[ns]")}
+    for c in columns:
+        out[c] = np.concatenate(values[c]) if values[c] else np.array([], np.float64)
+    return out
+
+
+# ==============================
+# 2. COLUMNAR CACHE
+# ==============================
+
+def _file_hash(path, block=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(path, columns):
+    key = hashlib.blake2b("\0".join(columns).encode(), digest_size=6).hexdigest()
+    folder = os.path.join(os.path.dirname(path) or ".", CACHE_DIR)
+    return os.path.join(folder, f"{os.path.basename(path)}.{key}.npz")
+
+
+def load(path, columns=(POWER_COLUMN,), chunk_rows=CHUNK_ROWS, cache=True):
+    """
+    DataFrame with a "time" column and one float column per sensor in
+    `columns` (rows whose value could not be parsed hold NaN).
+
+    The parsed arrays are cached in hwinfo_files/.cache as .npz. A cache
+    whose size and mtime match the CSV is used as is; if only those changed
+    (the file was copied or touched) the content hash decides, so only
+    really different logs are parsed again.
+    """
+    columns = list(columns)
+    st = os.stat(path)
+    cached = _cache_path(path, columns)
+
+    if cache and os.path.exists(cached):
+        with np.load(cached) as z:
+            same_stat = z["size"] == st.st_size and z["mtime_ns"] == st.st_mtime_ns
+            digest = str(z["hash"])
+            if same_stat or digest == _file_hash(path):
+                data = {"time": z["time"], **{c: z[f"col{i}"] for i, c in enumerate(columns)}}
+                if not same_stat:
+                    _save(cached, data, columns, st, digest)
+                return pd.DataFrame(data)
+
+    data = _parse(path, columns, chunk_rows)
+    if cache:
+        _save(cached, data, columns, st, _file_hash(path))
+    return pd.DataFrame(data)
+
+
+def _save(cached, data, columns, st, digest):
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp = cached + ".tmp.npz"
+    np.savez(tmp, time=data["time"], size=st.st_size, mtime_ns=st.st_mtime_ns, hash=digest,
+             **{f"col{i}": data[c] for i, c in enumerate(columns)})
+    os.replace(tmp, cached)   # readers never see a half-written cache
+
+
+# ==============================
+# 3. PER-LOG POWER SUMMARY
+# ==============================
+
+def summarize(path, column=POWER_COLUMN):
+    """Average of `column` in one <pattern>_<language>.CSV log, as a row
+    dict, or None if the name or the column does not fit."""
+    parts = os.path.splitext(os.path.basename(path))[0].split("_")
+    if len(parts) != 2:
+        print(f"⚠ Filename format incorrect: {os.path.basename(path)}")
+        return None
+    try:
+        power = load(path, [column])[column]
+    except KeyError:
+        print(f"⚠ Power column not found in {os.path.basename(path)}")
+        return None
+    return {"pattern": parts[0], "language": parts[1],
+            "average_power_w": power.mean(), "samples": int(power.count())}
+
+
+def power_summary(folder="hwinfo_files", column=POWER_COLUMN):
+    """summarize() for every log in folder."""
+    rows = [summarize(path, column) for path in log_files(folder)]
+    return pd.DataFrame([r for r in rows if r],
+                        columns=["pattern", "language", "average_power_w", "samples"])
+
+
+def log_files(folder="hwinfo_files"):
+    return sorted(glob.glob(os.path.join(folder, "*.[cC][sS][vV]")))
+
+
+if __name__ == "__main__":
+    import sys
+    print(power_summary(sys.argv[1] if len(sys.argv) > 1 else "hwinfo_files"))
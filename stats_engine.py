@@ -0,0 +1,202 @@
+import os
+import sys
+import sqlite3
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from scipy.stats import f as f_dist
+except ImportError:   # F-test p-values need scipy; everything else is numpy
+    f_dist = None
+
+# Grouped statistics over the raw per-run table (one row per run). Every
+# function works on whole columns: groupby aggregations, pivots, one
+# lstsq per ANOVA model and resampling as index matrices, instead of
+# filtering the frame once per pattern or language.
+
+# ==============================
+# CONFIGURATION
+# ==============================
+
+DB_PATH = "telemetry_results.db"
+N_BOOT = 2000
+BOOT_CHUNK = 500          # resamples per task; fixed so results do not depend on core count
+MAX_CELLS = 2_000_000     # bound on one resample index matrix (rows x runs)
+
+
+# ==============================
+# 1. GROUP SUMMARIES
+# ==============================
+
+def group_summary(df, by, value):
+    """count, mean, std, sem, min, median, max of `value` per group."""
+    g = df.groupby(by, sort=True)[value]
+    out = g.agg(["count", "mean", "std", "min", "median", "max"])
+    out["sem"] = out["std"] / np.sqrt(out["count"])
+    return out
+
+
+# ==============================
+# 2. PAIRWISE DELTAS
+# ==============================
+
+def pairwise_delta(df, index, factor, value, base, other, agg="mean"):
+    """Percentage difference of `other` vs `base` level of `factor`, per
+    `index` group: 100 * (other - base) / base. NaN where a level is missing."""
+    wide = df.pivot_table(index=index, columns=factor, values=value, aggfunc=agg)
+    if base not in wide or other not in wide:
+        return pd.Series(np.nan, index=wide.index, name=f"{other}_vs_{base}_%")
+    return ((wide[other] - wide[base]) / wide[base] * 100).rename(f"{other}_vs_{base}_%")
+
+
+# ==============================
+# 3. BOOTSTRAP
+# ==============================
+
+def _resample_means(task):
+    # one chunk of bootstrap means for one group
+    key, x, n_boot, seed = task
+    rng = np.random.default_rng(seed)
+    rows = max(1, min(n_boot, MAX_CELLS // max(len(x), 1)))
+    means = np.empty(n_boot)
+    for s in range(0, n_boot, rows):
+        k = min(rows, n_boot - s)
+        means[s:s + k] = x[rng.integers(0, len(x), size=(k, len(x)))].mean(axis=1)
+    return key, means
+
+
+def bootstrap_means(df, by, value, n_boot=N_BOOT, seed=0, workers=None):
+    """{group: array of n_boot resampled means}. Groups and chunks of
+    BOOT_CHUNK resamples run as separate tasks on a process pool; each task
+    has its own SeedSequence child, so the draws are reproducible for a
+    given seed whatever the number of workers."""
+    groups = [(key, g.to_numpy(np.float64)) for key, g in df.groupby(by, sort=True)[value]]
+    groups = [(key, x[~np.isnan(x)]) for key, x in groups]
+    groups = [(key, x) for key, x in groups if len(x)]
+
+    tasks = []
+    for key, x in groups:
+        for start in range(0, n_boot, BOOT_CHUNK):
+            tasks.append((key, x, min(BOOT_CHUNK, n_boot - start)))
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    tasks = [t + (s,) for t, s in zip(tasks, seeds)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as ex:
+            parts = list(ex.map(_resample_means, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        parts = list(map(_resample_means, tasks))
+
+    out = {}
+    for key, means in parts:
+        out.setdefault(key, []).append(means)
+    return {key: np.concatenate(chunks) for key, chunks in out.items()}
+
+
+def bootstrap_ci(df, by, value, ci=0.95, **kw):
+    """Percentile bootstrap CI of the mean per group."""
+    boots = bootstrap_means(df, by, value, **kw)
+    lo, hi = (1 - ci) / 2 * 100, (1 + ci) / 2 * 100
+    keys = list(boots)
+    q = np.percentile(np.stack([boots[k] for k in keys]), [lo, hi], axis=1) if keys else np.empty((2, 0))
+    index = pd.MultiIndex.from_tuples(keys, names=by) if keys and isinstance(keys[0], tuple) \
+        else pd.Index(keys, name=by if isinstance(by, str) else by[0])
+    return pd.DataFrame({"ci_low": q[0], "ci_high": q[1]}, index=index)
+
+
+def bootstrap_delta_ci(df, index, factor, value, base, other, ci=0.95, **kw):
+    """Bootstrap CI of pairwise_delta: the two levels are resampled
+    independently and the percentage difference is taken per resample."""
+    boots = bootstrap_means(df, [index, factor], value, **kw)
+    lo, hi = (1 - ci) / 2 * 100, (1 + ci) / 2 * 100
+    rows = {}
+    for key in sorted({k[0] for k in boots}):
+        if (key, base) in boots and (key, other) in boots:
+            b, o = boots[(key, base)], boots[(key, other)]
+            rows[key] = np.percentile((o - b) / b * 100, [lo, hi])
+    out = pd.DataFrame.from_dict(rows, orient="index", columns=["ci_low", "ci_high"])
+    out.index.name = index
+    return out
+
+
+# ==============================
+# 4. TWO-WAY ANOVA (TYPE II)
+# ==============================
+
+def _dummies(codes, levels):
+    # treatment coding: one column per level except the first
+    return (codes[:, None] == np.arange(1, levels)[None, :]).astype(np.float64)
+
+
+def _rss(X, y):
+    beta, _, rank, _ = np.linalg.lstsq(X, y, rcond=None)
+    r = y - X @ beta
+    return r @ r, rank
+
+
+def two_way_anova(df, a, b, value):
+    """
+    Type II two-way ANOVA of `value` on factors a, b and a:b, the same table
+    as statsmodels anova_lm(ols("y ~ C(a) * C(b)"), typ=2). Each model is
+    one least-squares fit on dummy-coded design matrices.
+    """
+    d = df[[a, b, value]].dropna()
+    y = d[value].to_numpy(np.float64)
+    ca, la = pd.factorize(d[a], sort=True)
+    cb, lb = pd.factorize(d[b], sort=True)
+    one = np.ones((len(y), 1))
+    A, B = _dummies(ca, len(la)), _dummies(cb, len(lb))
+    AB = (A[:, :, None] * B[:, None, :]).reshape(len(y), -1)
+
+    rss_a, _ = _rss(np.hstack([one, A]), y)
+    rss_b, _ = _rss(np.hstack([one, B]), y)
+    rss_ab, _ = _rss(np.hstack([one, A, B]), y)
+    rss_full, rank_full = _rss(np.hstack([one, A, B, AB]), y)
+    df_resid = len(y) - rank_full
+
+    table = pd.DataFrame({
+        "sum_sq": [rss_b - rss_ab, rss_a - rss_ab, rss_ab - rss_full, rss_full],
+        "df": [len(la) - 1, len(lb) - 1, (len(la) - 1) * (len(lb) - 1), df_resid],
+    }, index=[f"C({a})", f"C({b})", f"C({a}):C({b})", "Residual"])
+    ms_resid = rss_full / df_resid if df_resid else np.nan
+    table["F"] = table["sum_sq"] / table["df"] / ms_resid
+    table.loc["Residual", "F"] = np.nan
+    if f_dist is not None:
+        table["PR(>F)"] = f_dist.sf(table["F"], table["df"], df_resid)
+    else:
+        table["PR(>F)"] = np.nan
+    return table
+
+
+# ==============================
+# MAIN
+# ==============================
+
+def load_runs(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM benchmark_results", conn)
+    conn.close()
+    return df
+
+
+if __name__ == "__main__":
+
+    # python stats_engine.py [db] [value column]
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    value = sys.argv[2] if len(sys.argv) > 2 else "execution_time_ms"
+    runs = load_runs(db_path)
+
+    summary = group_summary(runs, ["pattern", "language"], value)
+    summary = summary.join(bootstrap_ci(runs, ["pattern", "language"], value))
+    print(f"\n{value} per pattern and language (95% bootstrap CI):")
+    print(summary)
+
+    delta = pairwise_delta(runs, "pattern", "language", value, base="java", other="python")
+    print("\nPython vs Java (%):")
+    print(pd.concat([delta, bootstrap_delta_ci(runs, "pattern", "language", value,
+                                               base="java", other="python")], axis=1))
+
+    print("\nTwo-way ANOVA (type II):")
+    print(two_way_anova(runs, "pattern", "language", value))